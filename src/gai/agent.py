@@ -6,9 +6,17 @@ Handles intent detection, plan generation, and prompt engineering.
 import json
 import re
 import ast
+import time
+import hashlib
+import threading
 from typing import Dict, Any, Optional, List
 
-from gai import gemini, scanner, config, ui
+try:
+    import orjson
+except ImportError:  # Optional speedup (pip install gai-ag[fast])
+    orjson = None
+
+from gai import gemini, scanner, config, ui, llm_cache, prefetch
 
 SYSTEM_PROMPT = """
 You are an expert Autonomous Code Agent (similar to Cursor or Devin).
@@ -52,36 +60,197 @@ REQUIRED STRUCTURE:
 - **SELF-CORRECTION SCOPE**: If tests fail after your changes, ONLY fix errors that are DIRECTLY caused by the files YOU modified. NEVER modify test files (tests/*) during self-correction. If tests fail due to pre-existing issues unrelated to your changes, simply report the failure and stop.
 """
 
+# Lifetime of the explicit Gemini context cache (seconds)
+CONTEXT_CACHE_TTL = 300
+
+# Contexts shorter than this are sent inline; Gemini rejects caches below a
+# minimum token count (roughly 4 characters per token)
+CONTEXT_CACHE_MIN_CHARS = 16_000
+
+# After a failed cache creation, don't try again for this model for a while
+CONTEXT_CACHE_RETRY_AFTER = 600
+
+# Cache name for SYSTEM_PROMPT + project context, keyed by (model, context hash).
+# "seen" is the key of the last context sent inline, so a cache is only
+# created once the same context is about to be sent a second time.
+_context_cache: Dict[str, Any] = {"key": None, "name": None, "expires": 0.0, "seen": None}
+
+# Model name -> monotonic time until which cache creation is not attempted
+_cache_unavailable: Dict[str, float] = {}
+
+def _drop_context_cache():
+    """Delete the current server-side cache in the background and forget it."""
+    name = _context_cache["name"]
+    if name:
+        threading.Thread(target=gemini.delete_cache, args=(name,), daemon=True).start()
+    _context_cache.update(key=None, name=None, expires=0.0)
+
+def get_context_cache(project_context: str) -> Optional[str]:
+    """
+    Return the Gemini cache holding SYSTEM_PROMPT and the project context,
+    or None when the context is sent inline.
+    The project context changes after every applied plan (it embeds the
+    project state), so a cache is only created when the same context is
+    sent again (a retry or a follow-up turn); the first use goes inline.
+    Caches are renewed shortly before they expire, and a superseded cache
+    is deleted. Small contexts are never cached, and a model whose cache
+    creation failed is skipped for CONTEXT_CACHE_RETRY_AFTER seconds.
+    """
+    if len(project_context) < CONTEXT_CACHE_MIN_CHARS:
+        return None
+
+    model = config.get_model()
+    now = time.monotonic()
+    if now < _cache_unavailable.get(model, 0.0):
+        return None
+
+    key = (model, hashlib.sha256(project_context.encode("utf-8")).hexdigest())
+    if _context_cache["key"] == key and now < _context_cache["expires"]:
+        return _context_cache["name"]
+    if _context_cache["key"] != key:
+        # The old context is superseded; stop paying for its storage
+        _drop_context_cache()
+        if _context_cache["seen"] != key:
+            _context_cache["seen"] = key
+            return None
+
+    name = gemini.create_cache(
+        SYSTEM_PROMPT,
+        f"## PROJECT CONTEXT\n{project_context}",
+        ttl=f"{CONTEXT_CACHE_TTL}s"
+    )
+    if name is None:
+        _cache_unavailable[model] = now + CONTEXT_CACHE_RETRY_AFTER
+        return None
+    _context_cache.update(key=key, name=name, expires=now + CONTEXT_CACHE_TTL - 30)
+    return name
+
+# Response cache key of the last plan returned by generate_plan
+_last_plan_key: Optional[str] = None
+
+def discard_last_plan():
+    """Drop the last plan from the response cache so asking again yields a fresh one."""
+    if _last_plan_key:
+        llm_cache.discard(_last_plan_key)
+
+def invalidate_context_cache():
+    """Forget the current context cache (e.g. after it expired server-side)."""
+    _context_cache.update(key=None, name=None, expires=0.0, seen=None)
+
+# Greedy {...} match, used when the brace scanner finds no balanced block
+_DICT_SPAN_RE = re.compile(r'\{.*\}', re.DOTALL)
+# A backslash that does not start a valid escape sequence (e.g. C:\Users)
+_BAD_ESCAPE_RE = re.compile(r'\\(?![\\nrt"\'ux])')
+
+# Keys every plan / action must carry
+_PLAN_KEYS = frozenset({"reasoning", "plan", "actions"})
+_ACTION_KEYS = frozenset({"action", "path"})
+
 def validate_plan(plan_data: Any) -> bool:
     """Validate the agent plan structure."""
-    if not isinstance(plan_data, dict):
-        return False
-    
-    required_keys = ["reasoning", "plan", "actions"]
-    if not all(k in plan_data for k in required_keys):
+    if not isinstance(plan_data, dict) or not plan_data.keys() >= _PLAN_KEYS:
         return False
     
-    if not isinstance(plan_data["reasoning"], str):
-        return False
-    if not isinstance(plan_data["plan"], (str, list)): 
-        return False
-    if not isinstance(plan_data["actions"], list):
+    actions = plan_data["actions"]
+    if not (
+        isinstance(plan_data["reasoning"], str)
+        and isinstance(plan_data["plan"], (str, list))
+        and isinstance(actions, list)
+    ):
         return False
         
-    for action in plan_data.get("actions", []):
-        if not isinstance(action, dict):
-            return False
-        if not all(k in action for k in ["action", "path"]):
-            return False
-            
-    return True
+    return all(isinstance(action, dict) and action.keys() >= _ACTION_KEYS for action in actions)
 
 def clean_llm_response(text: str) -> str:
     """Clean LLM response for robust parsing."""
-    # Remove markdown blocks if present
-    text = re.sub(r'```(?:python|json)?\n(.*?)\n```', r'\1', text, flags=re.DOTALL)
+    # Remove a surrounding markdown block if present (slice, no regex pass)
+    text = text.strip()
+    if text.startswith("```"):
+        first_nl = text.find("\n")
+        last_fence = text.rfind("```")
+        if first_nl != -1 and last_fence > first_nl:
+            text = text[first_nl + 1:last_fence]
     return text.strip()
 
+def _json_loads(text: str) -> Any:
+    """Decode JSON with orjson when available, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+class _DictSpanScanner:
+    """
+    Incremental, quote-aware scanner for the outermost {...} block.
+    Text can be fed in chunks while a response is streaming; braces inside
+    quoted strings (including triple-quoted ones) are ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.span: Optional[str] = None
+        self._start = -1
+        self._pos = 0
+        self._depth = 0
+        self._quote: Optional[str] = None
+        self._end = -1
+
+    def feed(self, chunk: str, final: bool = False) -> Optional[str]:
+        """
+        Add text and return the dict span once it is complete.
+        Pass final=True with the last chunk so trailing quotes are resolved.
+        """
+        if self.span is not None:
+            return self.span
+        self.text += chunk
+        text = self.text
+        n = len(text)
+        i = self._pos
+
+        if self._start == -1:
+            self._start = text.find("{", i)
+            if self._start == -1:
+                self._pos = n
+                return None
+            i = self._start
+
+        quote, end, depth = self._quote, self._end, self._depth
+        while i < n:
+            if quote:
+                # Jump straight to the closing quote unless an escape comes first
+                if end < i:
+                    end = text.find(quote, i)
+                    if end == -1:
+                        break  # Closing quote not received yet
+                escape = text.find("\\", i, end)
+                if escape != -1:
+                    i = escape + 2
+                    continue
+                i = end + len(quote)
+                quote = None
+                continue
+            ch = text[i]
+            if ch == "'" or ch == '"':
+                if i + 3 > n and not final:
+                    break  # Need more text to tell ' from '''
+                quote = ch * 3 if text.startswith(ch * 3, i) else ch
+                i += len(quote)
+                continue
+            if ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    self.span = text[self._start:i + 1]
+                    break
+            i += 1
+
+        self._pos, self._quote, self._end, self._depth = i, quote, end, depth
+        return self.span
+
+def _extract_dict_span(text: str) -> Optional[str]:
+    """Return the outermost {...} block of a complete response, or None."""
+    return _DictSpanScanner().feed(text, final=True)
+
 def parse_plan(text: str) -> Optional[Dict[str, Any]]:
     """
     Parse a plan from raw LLM text using multiple strategies.
@@ -89,12 +258,26 @@ def parse_plan(text: str) -> Optional[Dict[str, Any]]:
     """
     content = clean_llm_response(text)
     
-    # Strategy 1: Find the dict and try literal_eval
-    dict_match = re.search(r'\{.*\}', content, re.DOTALL)
-    if not dict_match:
-        return None
-        
-    dict_str = dict_match.group(0)
+    # Strategy 1: Find the dict (balanced scan, greedy match if unbalanced)
+    dict_str = _extract_dict_span(content)
+    if dict_str is None:
+        dict_match = _DICT_SPAN_RE.search(content)
+        if not dict_match:
+            return None
+        dict_str = dict_match.group(0)
+
+    return parse_plan_dict(dict_str)
+
+def parse_plan_dict(dict_str: str) -> Optional[Dict[str, Any]]:
+    """Decode an extracted {...} block into a validated plan."""
+    # Attempt 0: Plain JSON is the cheapest to decode; triple quotes mean a Python literal
+    if "'''" not in dict_str and '"""' not in dict_str:
+        try:
+            plan_data = _json_loads(dict_str)
+            if validate_plan(plan_data):
+                return plan_data
+        except ValueError:
+            pass
 
     # Attempt 1: Standard ast.literal_eval
     try:
@@ -108,7 +291,7 @@ def parse_plan(text: str) -> Optional[Dict[str, Any]]:
     try:
         # Escape backslashes that are not part of a valid escape sequence
         # We look for a backslash that is NOT followed by another backslash or n, r, t, ", ', u, x
-        fixed_str = re.sub(r'\\(?![\\nrt"\'ux])', r'\\\\', dict_str)
+        fixed_str = _BAD_ESCAPE_RE.sub(r'\\\\', dict_str)
         plan_data = ast.literal_eval(fixed_str)
         if validate_plan(plan_data):
             return plan_data
@@ -133,45 +316,81 @@ def generate_plan(user_request: str, history: Optional[List[Dict[str, str]]] = N
     Generate a modification plan based on user request.
     Handles scanning, prompting, and retry logic.
     """
-    # 1. Scanning
+    global _last_plan_key
+    
+    # 1. Scanning (a background prefetch leaves the scanner cache warm)
     with ui.create_spinner(ui.translate("agent_scanning")):
+        prefetch.wait_for_prefetch()
         project_context = scanner.scan_project()
     
-    # 2. Build Prompt
-    prompt = (
-        f"## PROJECT CONTEXT\n{project_context}\n"
-        f"## USER REQUEST\n{user_request}"
+    # 2. Reuse the plan of an identical request on an unchanged project
+    plan_key = llm_cache.make_key(
+        config.get_model(), SYSTEM_PROMPT, project_context,
+        json.dumps(history or []), user_request
     )
+    _last_plan_key = plan_key
+    cached_plan = llm_cache.get(plan_key)
+    if cached_plan and validate_plan(cached_plan):
+        ui.print_system("Reusing the cached plan for this request.")
+        return cached_plan
+    
+    # 3. Build Prompt (project context is sent once via the context cache when possible)
+    # The prompt is kept as separate parts so retries never copy the large context.
+    context_parts = ("## PROJECT CONTEXT", project_context)
+    request_part = f"## USER REQUEST\n{user_request}"
+    use_cache = True
     
-    current_prompt = prompt
+    retry_suffix = ""
     max_retries = 2
     
-    for attempt in range(max_retries + 1):
+    attempt = 0
+    while attempt <= max_retries:
         if attempt > 0:
             ui.print_system(f"Retrying with stricter format instructions (Attempt {attempt+1})...")
+        
+        # Re-checked per attempt: a retry reuses the context, which is when caching pays off
+        cache_name = get_context_cache(project_context) if use_cache else None
+        prompt_parts = (request_part,) if cache_name else (*context_parts, request_part)
             
         try:
-            response_text = gemini.generate_response(
-                current_prompt, 
+            # Stream the response and stop reading once the dict is closed
+            span_scanner = _DictSpanScanner()
+            for chunk in gemini.stream_response(
+                *prompt_parts,
+                retry_suffix,
                 history=history,
-                system_instruction=SYSTEM_PROMPT
-            )
+                system_instruction=SYSTEM_PROMPT,
+                cached_content=cache_name
+            ):
+                if span_scanner.feed(chunk):
+                    break
             
             # 4. Parse Response
-            plan = parse_plan(response_text)
+            if span_scanner.span:
+                plan = parse_plan_dict(span_scanner.span)
+            else:
+                plan = parse_plan(span_scanner.text)
             if plan:
+                llm_cache.put(plan_key, plan)
                 return plan
             
             # If parsing fails, refine prompt for retry
             ui.print_error(f"Agent - Parsing Failed (Attempt {attempt+1})")
-            current_prompt = (
-                f"{prompt}\n\n"
-                f"ERROR: Your last response could not be parsed as a Python dictionary.\n"
-                f"STRICT INSTRUCTION: Return ONLY the dictionary starting with '{{' and ending with '}}'.\n"
-                f"Use triple single-quotes (''' ) for 'content' fields. DO NOT use markdown code blocks."
+            retry_suffix = (
+                "ERROR: Your last response could not be parsed as a Python dictionary.\n"
+                "STRICT INSTRUCTION: Return ONLY the dictionary starting with '{' and ending with '}'.\n"
+                "Use triple single-quotes (''' ) for 'content' fields. DO NOT use markdown code blocks."
             )
+            attempt += 1
         except gemini.InvalidAPIKeyError:
             raise
+        except gemini.CacheNotFoundError as e:
+            if not cache_name:
+                ui.print_error(f"Agent - Gemini Error: {e}")
+                break
+            # The cache expired server-side; resend this attempt with the inline context
+            invalidate_context_cache()
+            use_cache = False
         except Exception as e:
             ui.print_error(f"Agent - Gemini Error: {e}")
             break
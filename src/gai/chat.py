@@ -1,22 +1,29 @@
+import os
 import sys
+import signal
+import subprocess
+import threading
 from prompt_toolkit import PromptSession
 from prompt_toolkit.styles import Style
 
-from gai import gemini, context, ui, config, agent, fs
+from gai import gemini, context, ui, config, agent, fs, prefetch
 from gai.completer import FileContextCompleter
-from typing import List
+from typing import List, Tuple, Union
 from pathlib import Path
 
 # Redundant keywords for intent detection (kept for documentation)
-AGENT_KEYWORDS = {
+AGENT_KEYWORDS = frozenset({
     "add", "create", "make", "write", "update", "modify", "change", "fix", 
     "refactor", "remove", "delete", "move", "rename", 
     "ekle", "oluştur", "yaz", "güncelle", "değiştir", "düzelt", "sil", "taşı"
-}
+})
 
 # Mode state
 AGENT_MODE = True
 
+# Max seconds a verification test run may take
+TEST_TIMEOUT = 120
+
 def get_test_command() -> List[str]:
     """Detect project type and return the appropriate test command."""
     cwd = Path(".")
@@ -32,226 +39,308 @@ def get_test_command() -> List[str]:
     # Python (Default)
     return [sys.executable, "-m", "pytest", "-v"]
 
-def handle_command(command: str) -> bool:
+def run_tests(test_cmd: List[str]) -> Tuple[int, str]:
     """
-    Handle chat slash commands.
+    Run the test command, echoing its output live.
     
     Returns:
-        bool: True if loop should continue, False if it should break (exit).
+        (returncode, combined stdout/stderr). A run killed after
+        TEST_TIMEOUT seconds reports returncode 1.
     """
-    cmd_parts = command.lower().split()
-    cmd = cmd_parts[0]
+    is_windows = sys.platform == "win32"
+    proc = subprocess.Popen(
+        test_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        cwd=".",
+        shell=is_windows,
+        # Own process group, so a timeout also kills grandchildren that
+        # would otherwise keep the output pipe open
+        start_new_session=not is_windows
+    )
+    timed_out = threading.Event()
+
+    def kill_tree():
+        try:
+            if is_windows:
+                subprocess.run(
+                    ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def on_timeout():
+        timed_out.set()
+        kill_tree()
+
+    timer = threading.Timer(TEST_TIMEOUT, on_timeout)
+    timer.start()
+    out_lines = []
+    try:
+        for line in proc.stdout:
+            ui.console.out(line.decode("utf-8", "replace"), end="", highlight=False)
+            out_lines.append(line)
+        returncode = proc.wait()
+    finally:
+        timer.cancel()
+        # Ctrl-C or any other error mid-run: the child is in its own session
+        # and never saw the terminal's SIGINT, so stop it here
+        if proc.poll() is None:
+            kill_tree()
+            proc.wait()
+        proc.stdout.close()
+
+    if timed_out.is_set():
+        ui.print_error("Tests timed out.")
+        returncode = 1
+    return returncode, b"".join(out_lines).decode("utf-8", "replace")
+
+def _cmd_exit(args: List[str]):
+    """/exit: end the session."""
+    ui.print_system("Goodbye.")
+    return False
+
+def _cmd_clear(args: List[str]):
+    """/clear: clear the screen and redraw the header."""
+    ui.console.clear()
+    ui.print_header()
+    ui.print_system(ui.translate("help_hint"))
+    return True
+
+def _cmd_help(args: List[str]):
+    """/help: list the available commands."""
+    ui.print_system(ui.translate("help_title"))
+    ui.print_system(ui.translate("help_desc"))
+    ui.print_system("  /newchat - Clear history and start a new session")
+    return True
+
+def _cmd_apikey(args: List[str]):
+    """/apikey: re-run the API key setup."""
+    ui.print_system("Updating API Key configuration...")
+    from gai.cli import onboarding_flow
+    onboarding_flow()
+    return True
+
+def _cmd_theme(args: List[str]):
+    """/theme <name>: switch the color theme."""
+    if not args:
+        ui.print_system("Usage: /theme [default|dark|light]")
+        return True
+    new_theme = args[0]
+    if new_theme not in ["default", "dark", "light"]:
+        ui.print_error(f"Unknown theme: {new_theme}")
+        return True
     
-    if cmd == "/exit":
-        ui.print_system("Goodbye.")
-        return False
-        
-    elif cmd == "/clear":
-        ui.console.clear()
-        ui.print_header()
-        ui.print_system(ui.translate("help_hint"))
+    config.save_theme(new_theme)
+    ui.reload_ui()
+    ui.print_success(f"Theme set to {new_theme}")
+    return True
+
+def _cmd_lang(args: List[str]):
+    """/lang <code>: switch the interface language."""
+    if not args:
+        ui.print_system("Usage: /lang [en|tr]")
         return True
-        
-    elif cmd == "/help":
-        ui.print_system(ui.translate("help_title"))
-        ui.print_system(ui.translate("help_desc"))
-        ui.print_system("  /newchat - Clear history and start a new session")
+    new_lang = args[0]
+    if new_lang not in ["en", "tr"]:
+        ui.print_error(f"Unknown language: {new_lang}")
         return True
         
-    elif cmd == "/apikey":
-        ui.print_system("Updating API Key configuration...")
-        from gai.cli import onboarding_flow
-        onboarding_flow()
-        return True
-    
-    elif cmd == "/theme":
-        if len(cmd_parts) < 2:
-            ui.print_system("Usage: /theme [default|dark|light]")
+    config.save_language(new_lang)
+    # In a real app we might need to reload more stuff, but here mostly UI text
+    ui.print_success(f"Language set to {new_lang}")
+    ui.print_system(ui.translate("welcome")) # Verify switch
+    return True
+
+def _cmd_model(args: List[str]):
+    """/model [name]: switch models directly or pick one from a table."""
+    # Define available models with metadata
+    models = [
+        {
+            "name": "gemini-2.0-flash-exp",
+            "display": "Gemini 2.0 Flash (Experimental)",
+            "speed": "Fastest",
+            "context": "1M tokens",
+            "pricing": "Free tier available"
+        },
+        {
+            "name": "gemini-2.0-flash-lite",
+            "display": "Gemini 2.0 Flash Lite",
+            "speed": "Fastest",
+            "context": "1M tokens",
+            "pricing": "Free tier available"
+        },
+        {
+            "name": "gemini-1.5-flash",
+            "display": "Gemini 1.5 Flash",
+            "speed": "Fast",
+            "context": "1M tokens",
+            "pricing": "$0.075/$0.30 per 1M tokens"
+        },
+        {
+            "name": "gemini-1.5-pro",
+            "display": "Gemini 1.5 Pro",
+            "speed": "Moderate",
+            "context": "2M tokens",
+            "pricing": "$1.25/$5.00 per 1M tokens"
+        }
+    ]
+
+    current_model = config.get_model()
+
+    # If model name is provided, switch directly
+    if args:
+        new_model = args[0]
+        model_names = [m["name"] for m in models]
+
+        if new_model not in model_names:
+            ui.print_error(f"Unknown model: {new_model}")
+            ui.print_system("Available models: " + ", ".join(model_names))
             return True
-        new_theme = cmd_parts[1]
-        if new_theme not in ["default", "dark", "light"]:
-             ui.print_error(f"Unknown theme: {new_theme}")
-             return True
-        
-        config.save_theme(new_theme)
-        ui.reload_ui()
-        ui.print_success(f"Theme set to {new_theme}")
+
+        config.save_model(new_model)
+        ui.print_success(f"Model set to {new_model}")
+        ui.print_system("New sessions will use this model.")
         return True
 
-    elif cmd == "/lang":
-         if len(cmd_parts) < 2:
-            ui.print_system("Usage: /lang [en|tr]")
-            return True
-         new_lang = cmd_parts[1]
-         if new_lang not in ["en", "tr"]:
-             ui.print_error(f"Unknown language: {new_lang}")
-             return True
-             
-         config.save_language(new_lang)
-         # In a real app we might need to reload more stuff, but here mostly UI text
-         ui.print_success(f"Language set to {new_lang}")
-         ui.print_system(ui.translate("welcome")) # Verify switch
-         return True
-    
-    
-    elif cmd == "/model":
-        # Define available models with metadata
-        models = [
-            {
-                "name": "gemini-2.0-flash-exp",
-                "display": "Gemini 2.0 Flash (Experimental)",
-                "speed": "Fastest",
-                "context": "1M tokens",
-                "pricing": "Free tier available"
-            },
-            {
-                "name": "gemini-2.0-flash-lite",
-                "display": "Gemini 2.0 Flash Lite",
-                "speed": "Fastest",
-                "context": "1M tokens",
-                "pricing": "Free tier available"
-            },
-            {
-                "name": "gemini-1.5-flash",
-                "display": "Gemini 1.5 Flash",
-                "speed": "Fast",
-                "context": "1M tokens",
-                "pricing": "$0.075/$0.30 per 1M tokens"
-            },
-            {
-                "name": "gemini-1.5-pro",
-                "display": "Gemini 1.5 Pro",
-                "speed": "Moderate",
-                "context": "2M tokens",
-                "pricing": "$1.25/$5.00 per 1M tokens"
-            }
-        ]
-        
-        current_model = config.get_model()
-        
-        # If model name is provided, switch directly
-        if len(cmd_parts) >= 2:
-            new_model = cmd_parts[1]
-            model_names = [m["name"] for m in models]
-            
-            if new_model not in model_names:
-                ui.print_error(f"Unknown model: {new_model}")
-                ui.print_system("Available models: " + ", ".join(model_names))
-                return True
-            
-            config.save_model(new_model)
-            ui.print_success(f"Model set to {new_model}")
-            ui.print_system("New sessions will use this model.")
-            return True
-        
-        # Interactive selection
-        # Use Rich Table for better display
-        from rich.table import Table
-        from rich.panel import Panel
-        from rich import box as rich_box
-        
-        table = Table(
-            show_header=True, 
-            header_style="accent", 
-            border_style="border", 
-            box=rich_box.ROUNDED, 
-            show_lines=True,
-            expand=True
+    # Interactive selection
+    # Use Rich Table for better display
+    from rich.table import Table
+    from rich.panel import Panel
+    from rich import box as rich_box
+
+    table = Table(
+        show_header=True, 
+        header_style="accent", 
+        border_style="border", 
+        box=rich_box.ROUNDED, 
+        show_lines=True,
+        expand=True
+    )
+    table.add_column("#", style="dim", width=3)
+    table.add_column("Model", style="bold")
+    table.add_column("Speed", justify="center")
+    table.add_column("Context Window", justify="center")
+    table.add_column("Pricing (Input/Output)", justify="right")
+
+    for idx, model in enumerate(models, 1):
+        marker = "›" if model["name"] == current_model else " "
+        name_display = f"{marker} {model['display']}"
+        if model["name"] == current_model:
+            name_display = f"[success]{name_display}[/success]"
+
+        table.add_row(
+            str(idx),
+            name_display,
+            model["speed"],
+            model["context"],
+            model["pricing"]
         )
-        table.add_column("#", style="dim", width=3)
-        table.add_column("Model", style="bold")
-        table.add_column("Speed", justify="center")
-        table.add_column("Context Window", justify="center")
-        table.add_column("Pricing (Input/Output)", justify="right")
-        
-        for idx, model in enumerate(models, 1):
-            marker = "›" if model["name"] == current_model else " "
-            name_display = f"{marker} {model['display']}"
-            if model["name"] == current_model:
-                name_display = f"[success]{name_display}[/success]"
-            
-            table.add_row(
-                str(idx),
-                name_display,
-                model["speed"],
-                model["context"],
-                model["pricing"]
-            )
-        
-        ui.console.print(Panel(
-            table,
-            title="[header] Available Gemini Models [/header]",
-            subtitle="[dim]Current model marked with ›[/dim]",
-            border_style="accent",
-            padding=(1, 2)
-        ))
+
+    ui.console.print(Panel(
+        table,
+        title="[header] Available Gemini Models [/header]",
+        subtitle="[dim]Current model marked with ›[/dim]",
+        border_style="accent",
+        padding=(1, 2)
+    ))
+    ui.console.print()
+
+    # Prompt for selection
+    try:
+        choice = ui.console.input("[accent]Select a model (1-{}) or press Enter to cancel:[/accent] ".format(len(models)))
+
+        if not choice.strip():
+            ui.print_system("Cancelled.")
+            return True
+
+        try:
+            choice_num = int(choice.strip())
+            if 1 <= choice_num <= len(models):
+                selected_model = models[choice_num - 1]
+                config.save_model(selected_model["name"])
+                ui.print_success(f"Model set to {selected_model['display']}")
+                ui.print_system("New sessions will use this model.")
+            else:
+                ui.print_error("Invalid selection. Please choose a number from the list.")
+        except ValueError:
+            ui.print_error("Please enter a valid number.")
+    except KeyboardInterrupt:
         ui.console.print()
+        ui.print_system("Cancelled.")
+
+    return True
+
+def _cmd_newchat(args: List[str]):
+    """/newchat: clear the current mode's history."""
+    mode_str = "agent" if AGENT_MODE else "chat"
+    config.clear_history(mode=mode_str)
+    ui.print_success(f"History cleared for {mode_str} mode. Starting a new session.")
+    return "RESET"
+
+def _cmd_info(args: List[str]):
+    """/info: show info.txt."""
+    # Look for info.txt in the package directory
+    info_path = Path(__file__).parent / "info.txt"
+    
+    # Fallback to CWD (for dev repo root)
+    if not info_path.exists():
+        info_path = Path("info.txt")
         
-        # Prompt for selection
+    if info_path.exists():
         try:
-            choice = ui.console.input("[accent]Select a model (1-{}) or press Enter to cancel:[/accent] ".format(len(models)))
-            
-            if not choice.strip():
-                ui.print_system("Cancelled.")
-                return True
-            
-            try:
-                choice_num = int(choice.strip())
-                if 1 <= choice_num <= len(models):
-                    selected_model = models[choice_num - 1]
-                    config.save_model(selected_model["name"])
-                    ui.print_success(f"Model set to {selected_model['display']}")
-                    ui.print_system("New sessions will use this model.")
-                else:
-                    ui.print_error("Invalid selection. Please choose a number from the list.")
-            except ValueError:
-                ui.print_error("Please enter a valid number.")
-        except KeyboardInterrupt:
-            ui.console.print()
-            ui.print_system("Cancelled.")
-        
-        return True
-        
-        
-    elif cmd == "/newchat":
-        mode_str = "agent" if AGENT_MODE else "chat"
-        config.clear_history(mode=mode_str)
-        ui.print_success(f"History cleared for {mode_str} mode. Starting a new session.")
-        return "RESET"
-        
-    elif cmd == "/info":
-        # Look for info.txt in the package directory
-        info_path = Path(__file__).parent / "info.txt"
-        
-        # Fallback to CWD (for dev repo root)
-        if not info_path.exists():
-            info_path = Path("info.txt")
-            
-        if info_path.exists():
-            try:
-                from rich.panel import Panel
-                content = info_path.read_text(encoding="utf-8")
-                ui.console.print(Panel(content.strip(), title="[accent]Application Info[/accent]", border_style="accent"))
-            except Exception as e:
-                ui.print_error(f"Could not read info.txt: {e}")
-        else:
-            ui.print_error("info.txt not found. Please ensure it exists in the package directory.")
-        return True
-        
-    elif cmd == "/chat":
-        global AGENT_MODE
-        AGENT_MODE = not AGENT_MODE
-        status = "ENABLED" if AGENT_MODE else "DISABLED"
-        ui.print_success(f"Agent mode is now {status}.")
-        if not AGENT_MODE:
-            ui.print_system("Conversation mode active. I will focus on chatting.")
-        else:
-            ui.print_system("Agent mode active. I can help with file operations.")
-        return "SWITCH_MODE"
-        
+            from rich.panel import Panel
+            content = info_path.read_text(encoding="utf-8")
+            ui.console.print(Panel(content.strip(), title="[accent]Application Info[/accent]", border_style="accent"))
+        except Exception as e:
+            ui.print_error(f"Could not read info.txt: {e}")
     else:
+        ui.print_error("info.txt not found. Please ensure it exists in the package directory.")
+    return True
+
+def _cmd_chat(args: List[str]):
+    """/chat: toggle between agent and chat mode."""
+    global AGENT_MODE
+    AGENT_MODE = not AGENT_MODE
+    status = "ENABLED" if AGENT_MODE else "DISABLED"
+    ui.print_success(f"Agent mode is now {status}.")
+    if not AGENT_MODE:
+        ui.print_system("Conversation mode active. I will focus on chatting.")
+    else:
+        ui.print_system("Agent mode active. I can help with file operations.")
+    return "SWITCH_MODE"
+
+# Slash command dispatch table
+_COMMANDS = {
+    "/exit": _cmd_exit,
+    "/clear": _cmd_clear,
+    "/help": _cmd_help,
+    "/apikey": _cmd_apikey,
+    "/theme": _cmd_theme,
+    "/lang": _cmd_lang,
+    "/model": _cmd_model,
+    "/newchat": _cmd_newchat,
+    "/info": _cmd_info,
+    "/chat": _cmd_chat,
+}
+
+def handle_command(command: str) -> Union[bool, str]:
+    """
+    Handle chat slash commands.
+    
+    Returns:
+        bool: True if loop should continue, False if it should break (exit).
+        str: "RESET" or "SWITCH_MODE" for session-level changes.
+    """
+    head, _, rest = command.strip().partition(" ")
+    handler = _COMMANDS.get(head.lower())
+    if handler is None:
         ui.print_system(ui.translate("unknown_command"))
         return True
+    return handler(rest.lower().split())
 
 
 def start_chat_session():
@@ -280,6 +369,9 @@ def start_chat_session():
     current_history = config.load_history(mode=current_mode)
     if current_history:
         ui.print_system(f"Resuming previous {current_mode} session ({len(current_history)} turns). Use /newchat to start fresh.")
+    if AGENT_MODE:
+        # Scan while the user types the first request
+        prefetch.prefetch_project_context()
 
     while True:
         try:
@@ -297,11 +389,7 @@ def start_chat_session():
                     current_history = []
                     continue
                 if cmd_result == "SWITCH_MODE":
-                    # Save current history before switching
-                    old_mode = "chat" if AGENT_MODE else "agent" # AGENT_MODE was already toggled in handle_command
-                    config.save_history(current_history, mode=old_mode)
-                    
-                    # Switch to new mode history
+                    # Switch to new mode history (turns are already persisted as they happen)
                     new_mode = "agent" if AGENT_MODE else "chat"
                     current_history = config.load_history(mode=new_mode)
                     
@@ -322,13 +410,16 @@ def start_chat_session():
 
             # --- CHAT MODE (Simple Conversation) ---
             if not AGENT_MODE:
-                with ui.create_spinner(ui.translate("thinking")):
-                    response = gemini.generate_response(cleaned_input, history=current_history)
-                
-                ui.print_message("Gemini", response)
-                current_history.append({"role": "user", "content": cleaned_input})
-                current_history.append({"role": "model", "content": response})
-                config.save_history(current_history, mode="chat")
+                # Render the reply as it streams in
+                response = ui.stream_message(
+                    gemini.stream_response(cleaned_input, history=current_history)
+                )
+                new_turns = [
+                    {"role": "user", "content": cleaned_input},
+                    {"role": "model", "content": response},
+                ]
+                current_history.extend(new_turns)
+                config.append_history(new_turns, mode="chat")
                 continue
 
             # --- AGENT MODE (Autonomous Planning & Execution) ---
@@ -361,9 +452,12 @@ def start_chat_session():
                 # If no actions, just show result and break loop (return to prompt)
                 if not plan.get("actions"):
                     # Save to history for context
-                    agent_history.append({"role": "user", "content": current_request})
-                    agent_history.append({"role": "assistant", "content": plan.get("reasoning", "Analysis complete.")})
-                    config.save_history(agent_history)
+                    new_turns = [
+                        {"role": "user", "content": current_request},
+                        {"role": "assistant", "content": plan.get("reasoning", "Analysis complete.")},
+                    ]
+                    current_history.extend(new_turns)
+                    config.append_history(new_turns, mode="agent")
                     break
 
                 # Ask Confirmation for modifications
@@ -373,19 +467,17 @@ def start_chat_session():
                     ui.print_system(ui.translate("applying_changes"))
                     results = fs.apply_actions(plan["actions"])
                     
-                    success = True
-                    for res in results:
-                        if res["status"] == "success":
-                            ui.print_success(f"✔ {res['message']}")
-                        else:
-                            ui.print_error(f"✖ {res['message']}")
-                            success = False
+                    ui.print_action_results(results)
+                    success = all(res["status"] == "success" for res in results)
                     
                     # Save state/history after success
                     summary = f"Applied plan: {plan.get('plan', 'No summary')}"
-                    current_history.append({"role": "user", "content": current_request})
-                    current_history.append({"role": "assistant", "content": summary})
-                    config.save_history(current_history, mode="agent")
+                    new_turns = [
+                        {"role": "user", "content": current_request},
+                        {"role": "assistant", "content": summary},
+                    ]
+                    current_history.extend(new_turns)
+                    config.append_history(new_turns, mode="agent")
                     
                     # Update project brain
                     config.save_state({
@@ -397,34 +489,15 @@ def start_chat_session():
                     # Automaton: Run Tests and Self-Correct
                     if success:
                         ui.print_system("Running verification tests...")
-                        import subprocess
                         try:
                             test_cmd = get_test_command()
                             ui.print_system(f"Executing: {' '.join(test_cmd)}")
                             
                             try:
-                                test_result = subprocess.run(
-                                    test_cmd,
-                                    capture_output=True, 
-                                    text=True, 
-                                    cwd=".",
-                                    encoding="utf-8",
-                                    errors="replace",
-                                    shell=True if sys.platform == "win32" else False,
-                                    timeout=120 # 2 minute limit
-                                )
-                                stdout = test_result.stdout or ""
-                                stderr = test_result.stderr or ""
-                                returncode = test_result.returncode
-                            except subprocess.TimeoutExpired as te:
-                                ui.print_error("Tests timed out.")
-                                stdout = te.stdout or ""
-                                stderr = te.stderr or ""
-                                returncode = 1
+                                returncode, error_log = run_tests(test_cmd)
                             except Exception as e:
                                 ui.print_error(f"Execution error: {e}")
-                                stdout = ""
-                                stderr = str(e)
+                                error_log = str(e)
                                 returncode = 1
                             
                             if returncode == 0:
@@ -446,7 +519,6 @@ def start_chat_session():
                                 # Only attempt self-correction if we modified actual source code
                                 if modified_src:
                                     ui.print_error("Tests failed. Attempting self-correction...")
-                                    error_log = stdout + "\n" + stderr
                                     config.save_state({
                                         "last_task": current_request,
                                         "status": "failed",
@@ -470,8 +542,13 @@ def start_chat_session():
                     else:
                         break
                 else:
+                    # Don't serve the rejected plan again for the same request
+                    agent.discard_last_plan()
                     ui.print_system(ui.translate("cancelled"))
                     break
+
+            # Rescan in the background while the user reads the result
+            prefetch.prefetch_project_context()
             
         except KeyboardInterrupt:
             ui.print_system("\nGoodbye.")
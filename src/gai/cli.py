@@ -1,5 +1,7 @@
 import sys
+import importlib.util
 import subprocess
+from functools import lru_cache
 
 def check_dependencies():
     """Check if required dependencies are installed, install them if not."""
@@ -11,7 +13,8 @@ def check_dependencies():
     ]
     
     missing = []
-    # Simple check by trying to import main modules
+    # Locate the main modules without importing them, so this check does not
+    # load Typer or prompt_toolkit before they are needed
     # Mapping package names to import names
     package_to_import = {
         "typer[all]": "typer",
@@ -22,8 +25,11 @@ def check_dependencies():
 
     for pkg, imp in package_to_import.items():
         try:
-            __import__(imp)
+            found = importlib.util.find_spec(imp) is not None
         except ImportError:
+            # Parent package (e.g. google) is missing
+            found = False
+        if not found:
             missing.append(pkg)
 
     if missing:
@@ -38,60 +44,37 @@ def check_dependencies():
             print("Please install them manually using: pip install " + " ".join(missing))
             sys.exit(1)
 
-def start():
-    """Entry point for the script."""
-    # Check dependencies before importing anything heavy
-    check_dependencies()
-    
-    # Delayed imports to handle missing packages
-    import typer
-    from gai.cli import app
-    app()
+def onboarding_flow() -> bool:
+    """
+    Run the first-time setup for API key.
+    """
+    from gai import config, ui
+    ui.print_welcome()
+    ui.console.print(f"{ui.translate('get_key_link')}\n", style=f"link {ui.translate('get_key_link').split()[-1]}")
+    key = ui.console.input(f"[bold yellow]{ui.translate('api_key_prompt')}[/bold yellow] ", password=True)
+    if not key.strip():
+        ui.print_error(ui.translate("api_key_missing"))
+        return False
+    config.save_api_key(key.strip())
+    ui.print_success(ui.translate("api_key_saved"))
+    return True
 
-# Move the Typer app and commands to a place where they won't trigger imports prematurely
-# Actually, the 'from gai.cli import app' above handles it if we keep the rest of the file as is
-# but we need to make sure the top-level imports in cli.py are safe.
-
-# --- Original Imports (Moved to top of file but inside a check or after check) ---
-# We'll keep them at top but we need to ensure check_dependencies runs FIRST.
-# The 'gai.cli' import in start() will actually re-import this file.
-# To avoid infinite loop and ensure check runs first:
-if __name__ == "__main__":
-    start()
-
-# --- Everything below this line is the actual CLI logic ---
-# It will be imported by 'from gai.cli import app'
-try:
+@lru_cache(maxsize=None)
+def _build_app():
+    """
+    Create the Typer app on first use, so importing gai.cli (e.g. from chat)
+    does not pay for Typer/Click setup.
+    """
     import typer
-    from rich.markdown import Markdown
-    from gai import gemini, context, chat, config, ui
-except ImportError:
-    # This might happen during the 'from gai.cli import app' call if check_dependencies 
-    # hasn't finished or if it's being imported by another module.
-    # But since start() calls check_dependencies() first, we should be fine.
-    pass
+    # chat (and prompt_toolkit with it) is imported lazily by the interactive branch
+    from gai import gemini, context, config, ui
 
-if 'typer' in sys.modules:
     app = typer.Typer(
         name="gai",
         help="Google AI Studio CLI tool.",
         add_completion=False,
     )
 
-    def onboarding_flow() -> bool:
-        """
-        Run the first-time setup for API key.
-        """
-        ui.print_welcome()
-        ui.console.print(f"{ui.translate('get_key_link')}\n", style=f"link {ui.translate('get_key_link').split()[-1]}")
-        key = ui.console.input(f"[bold yellow]{ui.translate('api_key_prompt')}[/bold yellow] ", password=True)
-        if not key.strip():
-            ui.print_error(ui.translate("api_key_missing"))
-            return False
-        config.save_api_key(key.strip())
-        ui.print_success(ui.translate("api_key_saved"))
-        return True
-
     @app.callback(invoke_without_command=True)
     def main(
         ctx: typer.Context,
@@ -134,4 +117,22 @@ if 'typer' in sys.modules:
                     ui.print_error(str(e))
                     raise typer.Exit(code=1)
             else:
+                from gai import chat
                 chat.start_chat_session()
+
+    return app
+
+def __getattr__(name: str):
+    # Keep `from gai.cli import app` working without building it at import
+    if name == "app":
+        return _build_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def start():
+    """Entry point for the script."""
+    # Check dependencies before importing anything heavy
+    check_dependencies()
+    _build_app()()
+
+if __name__ == "__main__":
+    start()
@@ -5,9 +5,16 @@ Handles loading/saving settings to ~/.gai/config.json and retrieving API keys.
 
 import os
 import json
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
+try:
+    import orjson
+except ImportError:  # Optional speedup (pip install gai-ag[fast])
+    orjson = None
+
 # Constants
 GLOBAL_CONFIG_DIR = Path.home() / ".gai"
 GLOBAL_CONFIG_FILE = GLOBAL_CONFIG_DIR / "config.json"
@@ -16,6 +23,29 @@ DEFAULT_MODEL = "gemini-2.0-flash-exp"
 CONFIG_DIR = GLOBAL_CONFIG_DIR # For mocking in tests
 CONFIG_FILE = GLOBAL_CONFIG_FILE # For mocking in tests
 
+def _dumps(obj: Any, indent: bool = False) -> bytes:
+    """Encode obj as UTF-8 JSON bytes; compact unless indent is set."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def _loads(data: bytes) -> Any:
+    """
+    Decode JSON bytes. Invalid input raises ValueError: json.JSONDecodeError,
+    orjson.JSONDecodeError, or UnicodeDecodeError for bytes cut mid-character.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _atomic_write(path: Path, data: bytes):
+    """Write data to a temp file beside path, then rename it over path."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
 def get_project_dir(root: Optional[Path] = None, subfolder: Optional[str] = None) -> Path:
     """Get the local .gai directory or a subfolder within it."""
     base = root if root else Path.cwd()
@@ -27,30 +57,93 @@ def get_project_dir(root: Optional[Path] = None, subfolder: Optional[str] = None
     return pdir
 
 def get_history_file(root: Optional[Path] = None, mode: str = "agent") -> Path:
-    """Get the path to the mode-specific history file."""
+    """Get the path to the mode-specific history file (one JSON entry per line)."""
     subfolder = "chat" if mode == "chat" else None
-    return get_project_dir(root, subfolder=subfolder) / "history.json"
+    return get_project_dir(root, subfolder=subfolder) / "history.jsonl"
 
 def get_state_file(root: Optional[Path] = None) -> Path:
     """Get the path to the project-specific state file."""
     return get_project_dir(root) / "state.json"
 
+# In-memory copy of the global config, validated against the file's stat
+_CACHE: Optional[Dict[str, Any]] = None
+_CACHE_KEY: Optional[tuple] = None
+
+# Nesting depth of batch() blocks; writes are deferred while > 0
+_BATCH_DEPTH = 0
+_BATCH_DIRTY = False
+
+# Guards the cache and config file; reentrant because batch() loads and saves
+_CFG_LOCK = threading.RLock()
+
+def _stat_key(config_file: Path) -> Optional[tuple]:
+    """Identify the current version of the config file by path, mtime and size."""
+    try:
+        st = config_file.stat()
+    except OSError:
+        return None
+    return (config_file, st.st_mtime_ns, st.st_size)
+
 def _load_config() -> Dict[str, Any]:
-    """Load global configuration from disk."""
+    """Load global configuration from disk (cached until the file changes)."""
+    global _CACHE, _CACHE_KEY
     config_file = globals().get('CONFIG_FILE', GLOBAL_CONFIG_FILE)
-    if not config_file.exists():
-        return {}
-    try:
-        return json.loads(config_file.read_text(encoding="utf-8"))
-    except json.JSONDecodeError:
-        return {}
+    with _CFG_LOCK:
+        if _BATCH_DEPTH and _CACHE is not None:
+            return dict(_CACHE)
+
+        key = _stat_key(config_file)
+        if key is None:
+            return {}
+        if _CACHE is not None and key == _CACHE_KEY:
+            return dict(_CACHE)
+
+        try:
+            data = _loads(config_file.read_bytes())
+        except ValueError:
+            return {}
+        _CACHE, _CACHE_KEY = data, key
+        return dict(data)
 
 def _save_config(config: Dict[str, Any]):
-    """Save global configuration to disk."""
+    """Save global configuration to disk (atomically, via a temp file)."""
+    global _CACHE, _CACHE_KEY, _BATCH_DIRTY
     config_dir = globals().get('CONFIG_DIR', GLOBAL_CONFIG_DIR)
     config_file = globals().get('CONFIG_FILE', GLOBAL_CONFIG_FILE)
-    config_dir.mkdir(parents=True, exist_ok=True)
-    config_file.write_text(json.dumps(config, indent=2), encoding="utf-8")
+    with _CFG_LOCK:
+        if _BATCH_DEPTH:
+            _CACHE = dict(config)
+            _BATCH_DIRTY = True
+            return
+
+        config_dir.mkdir(parents=True, exist_ok=True)
+        # Indented: config.json is meant to be human-editable
+        _atomic_write(config_file, _dumps(config, indent=True))
+        # Only cache what actually reached the disk
+        _CACHE, _CACHE_KEY = dict(config), _stat_key(config_file)
+
+@contextmanager
+def batch():
+    """
+    Group several settings changes into a single write, e.g.:
+
+        with config.batch():
+            config.save_theme("dark")
+            config.save_language("tr")
+    """
+    global _CACHE, _CACHE_KEY, _BATCH_DEPTH, _BATCH_DIRTY
+    with _CFG_LOCK:
+        if _BATCH_DEPTH == 0:
+            # Start from the on-disk state so the batch sees external edits
+            _CACHE, _CACHE_KEY = _load_config(), None
+        _BATCH_DEPTH += 1
+        try:
+            yield
+        finally:
+            _BATCH_DEPTH -= 1
+            if _BATCH_DEPTH == 0 and _BATCH_DIRTY:
+                _BATCH_DIRTY = False
+                _save_config(_CACHE)
 
 def get_api_key() -> Optional[str]:
     """
@@ -118,26 +211,59 @@ def save_mode(mode: str) -> None:
     config["mode"] = mode
     _save_config(config)
 
+def _dump_history_lines(entries: List[Dict[str, str]]) -> bytes:
+    """Serialize history entries as JSON lines."""
+    return b"".join(_dumps(entry) + b"\n" for entry in entries)
+
 def load_history(root: Optional[Path] = None, mode: str = "agent") -> List[Dict[str, str]]:
     """Load session history from the local project .gai directory."""
     hfile = get_history_file(root, mode=mode)
     if not hfile.exists():
-        return []
-    try:
-        return json.loads(hfile.read_text(encoding="utf-8"))
-    except Exception:
-        return []
+        # Sessions saved before the switch to JSON lines
+        legacy = hfile.with_suffix(".json")
+        if not legacy.exists():
+            return []
+        try:
+            return _loads(legacy.read_bytes())
+        except (OSError, ValueError):
+            return []
+
+    history = []
+    with open(hfile, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                history.append(_loads(line))
+            except ValueError:
+                # Skip a line torn by an interrupted write
+                continue
+    return history
 
 def save_history(history: List[Dict[str, str]], root: Optional[Path] = None, mode: str = "agent"):
-    """Save session history to the local project .gai directory."""
+    """Rewrite the whole session history in the local project .gai directory."""
+    hfile = get_history_file(root, mode=mode)
+    hfile.write_bytes(_dump_history_lines(history))
+    legacy = hfile.with_suffix(".json")
+    if legacy.exists():
+        legacy.unlink()
+
+def append_history(entries: List[Dict[str, str]], root: Optional[Path] = None, mode: str = "agent"):
+    """Append new turns to the session history without rewriting earlier ones."""
     hfile = get_history_file(root, mode=mode)
-    hfile.write_text(json.dumps(history, indent=2), encoding="utf-8")
+    if not hfile.exists() and hfile.with_suffix(".json").exists():
+        # First write after upgrading: convert the old JSON file once
+        save_history(load_history(root, mode=mode) + list(entries), root=root, mode=mode)
+        return
+    with open(hfile, "ab") as f:
+        f.write(_dump_history_lines(entries))
 
 def clear_history(root: Optional[Path] = None, mode: str = "agent"):
     """Clear session history for the current project."""
     hfile = get_history_file(root, mode=mode)
-    if hfile.exists():
-        hfile.unlink()
+    for path in (hfile, hfile.with_suffix(".json")):
+        if path.exists():
+            path.unlink()
 
 def load_state(root: Optional[Path] = None) -> Dict[str, Any]:
     """Load project state from the local .gai directory."""
@@ -145,11 +271,11 @@ def load_state(root: Optional[Path] = None) -> Dict[str, Any]:
     if not sfile.exists():
         return {}
     try:
-        return json.loads(sfile.read_text(encoding="utf-8"))
-    except Exception:
+        return _loads(sfile.read_bytes())
+    except (OSError, ValueError):
         return {}
 
 def save_state(state: Dict[str, Any], root: Optional[Path] = None):
     """Save project state to the local .gai directory."""
     sfile = get_state_file(root)
-    sfile.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    _atomic_write(sfile, _dumps(state))
@@ -6,8 +6,11 @@ It supports reading single files like `@file.py` and directories like `@src/`.
 """
 
 import os
+from functools import lru_cache
 from pathlib import Path
 
+from gai.scanner import MAX_FILE_SIZE
+
 # Common directories to ignore
 IGNORE_DIRS = {
     ".git", "__pycache__", "venv", ".venv", "node_modules", 
@@ -21,6 +24,22 @@ IGNORE_EXTS = {
     ".tar", ".gz", ".7z", ".db", ".sqlite", ".sqlite3"
 }
 
+@lru_cache(maxsize=128)
+def _read_cached(path_str: str, mtime_ns: int, size: int) -> str:
+    """Read a file's text; the stat values only serve as part of the cache key."""
+    with open(path_str, encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+def _read_text(path: Path) -> str:
+    """
+    Read a file's text, reusing the previous read while it is unchanged.
+    Only files up to MAX_FILE_SIZE are cached, so the cache stays small.
+    """
+    st = path.stat()
+    if st.st_size > MAX_FILE_SIZE:
+        return path.read_text(encoding="utf-8", errors="ignore")
+    return _read_cached(str(path), st.st_mtime_ns, st.st_size)
+
 def load_context(path_str: str) -> str:
     """
     Load context from a file or directory path.
@@ -52,15 +71,15 @@ def load_context(path_str: str) -> str:
 def _read_file_context(path: Path) -> str:
     """Read a single file and wrap it in context blocks."""
     try:
-        content = path.read_text(encoding="utf-8", errors="ignore")
-        return (
-            f"Analyze the following file:\n\n"
-            f"--- {path.name} ---\n"
-            f"{content}\n"
-            f"--- End of {path.name} ---\n"
-        )
-    except Exception as e:
+        content = _read_text(path)
+    except OSError as e:
         raise PermissionError(f"Could not read file {path.name}: {e}")
+    return (
+        f"Analyze the following file:\n\n"
+        f"--- {path.name} ---\n"
+        f"{content}\n"
+        f"--- End of {path.name} ---\n"
+    )
 
 
 def _read_dir_context(path: Path) -> str:
@@ -81,23 +100,23 @@ def _read_dir_context(path: Path) -> str:
                 continue
                 
             try:
-                # Attempt to read as text
+                # Attempt to read as text (undecodable bytes are ignored).
+                # Not cached: a whole directory would crowd out @file entries
                 content = file_path.read_text(encoding="utf-8", errors="ignore")
-                
-                # Simple check for binary content that might have slipped through (e.g. null bytes)
-                if "\0" in content:
-                    continue
-                
-                rel_path = file_path.relative_to(path.parent)
-                context_parts.append(
-                    f"\n--- {rel_path} ---\n"
-                    f"{content}\n"
-                )
-                file_count += 1
-                
-            except Exception:
+            except OSError:
                 # Silently skip files we can't read
                 continue
+                
+            # Simple check for binary content that might have slipped through (e.g. null bytes)
+            if "\0" in content:
+                continue
+            
+            rel_path = file_path.relative_to(path.parent)
+            context_parts.append(
+                f"\n--- {rel_path} ---\n"
+                f"{content}\n"
+            )
+            file_count += 1
 
     if file_count == 0:
         return f"Directory '{path.name}' contains no readable text files."
@@ -116,8 +135,6 @@ def process_prompt(prompt: str) -> str:
     Returns:
         str: The prompt with context injected.
     """
-    import re
-    
     # We want to match tokens starting with @ but not if they are email addresses (simplistic check)
     # A simple approach: split by whitespace, check tokens.
     # To handle quotes, we might need a more robust parser, but for now, simple whitespace split is verified behavior.
@@ -4,6 +4,7 @@ Ensures all file actions are restricted to the current working directory.
 """
 
 import os
+import shutil
 from pathlib import Path
 from typing import List, Dict, Any, Union, Optional
 
@@ -16,15 +17,16 @@ class UnsafePathError(FileSystemError):
     pass
 
 # Safety constants
-IGNORED_DIRS = {
+IGNORED_DIRS = frozenset({
     'node_modules', '.git', '__pycache__', 'venv', '.venv', '.env', 
     'build', 'dist', '.pytest_cache', '.gai', '.vscode', 'coverage'
-}
+})
 
-SYSTEM_PATHS = {
+# Tuple so a single str.startswith call checks every prefix
+SYSTEM_PATHS = tuple(sorted({
     "C:\\Windows", "C:\\Program Files", "C:\\Program Files (x86)",
     "/etc", "/usr", "/bin", "/sbin", "/var", "/opt"
-}
+}))
 
 def validate_path(path: Union[str, Path], root: Optional[Path] = None, allow_new: bool = True) -> Path:
     """
@@ -35,28 +37,31 @@ def validate_path(path: Union[str, Path], root: Optional[Path] = None, allow_new
         root: The allowed base directory (default: CWD).
         allow_new: If True, path doesn't need to exist yet.
     """
-    cwd = (root or Path.cwd()).resolve()
+    return _validate_path_with_cwd(path, (root or Path.cwd()).resolve())
+
+def _validate_path_with_cwd(path: Union[str, Path], cwd: Path) -> Path:
+    """validate_path against an already resolved base directory."""
     target_path = Path(path).resolve()
+    target_str = str(target_path)
+    cwd_str = str(cwd)
     
-    # Check if path is within root
+    # Check if path is within root (commonpath raises ValueError across drives)
     try:
-        target_path.relative_to(cwd)
+        inside = os.path.commonpath([cwd_str, target_str]) == cwd_str
     except ValueError:
+        inside = False
+    if not inside:
         raise UnsafePathError(f"Path restricted: {path} is outside the allowed directory ({cwd}).")
         
     # Check for specific system path prefixes (defensive depth)
-    target_str = str(target_path)
-    for sys_path in SYSTEM_PATHS:
-        if target_str.startswith(sys_path):
-            raise UnsafePathError(f"Path blocked: {path} is a system directory.")
+    if target_str.startswith(SYSTEM_PATHS):
+        raise UnsafePathError(f"Path blocked: {path} is a system directory.")
             
-    # Check for ignored directories traversal
-    parts = target_path.parts
-    for part in parts:
-        if part in IGNORED_DIRS:
-             # We allow reading from ignored dirs? maybe not. 
-             # For writing/editing, definitely unsafe to touch internal cache/git files.
-             raise UnsafePathError(f"Path restricted: Cannot modify files in {part}.")
+    # Check for ignored directories traversal.
+    # For writing/editing, definitely unsafe to touch internal cache/git files.
+    if not IGNORED_DIRS.isdisjoint(target_path.parts):
+        part = next(p for p in target_path.parts if p in IGNORED_DIRS)
+        raise UnsafePathError(f"Path restricted: Cannot modify files in {part}.")
 
     return target_path
 
@@ -72,6 +77,16 @@ def apply_actions(actions: List[Dict[str, str]], root: Optional[Path] = None) ->
          List of results dicts: {'path': str, 'status': 'success'|'error', 'message': str}
     """
     results = []
+    # Resolve the base directory once for the whole plan
+    cwd = (root or Path.cwd()).resolve()
+    # Parent directories already created during this plan
+    made_dirs = set()
+
+    def ensure_parent(path: Path):
+        parent = path.parent
+        if parent not in made_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            made_dirs.add(parent)
     
     for action in actions:
         act_type = action.get("action", "").lower()
@@ -81,11 +96,11 @@ def apply_actions(actions: List[Dict[str, str]], root: Optional[Path] = None) ->
         result = {"path": path_str, "status": "pending"}
         
         try:
-            target = validate_path(path_str, root=root, allow_new=True)
+            target = _validate_path_with_cwd(path_str, cwd)
             
             if act_type in ("create", "write", "replace"):
                 # Ensure parent dirs exist
-                target.parent.mkdir(parents=True, exist_ok=True)
+                ensure_parent(target)
                 
                 # Check create collision
                 if act_type == "create" and target.exists():
@@ -111,8 +126,9 @@ def apply_actions(actions: List[Dict[str, str]], root: Optional[Path] = None) ->
                 else:
                     try:
                         if target.is_dir():
-                            import shutil
                             shutil.rmtree(target)
+                            # Directories made earlier may have been removed with it
+                            made_dirs.clear()
                             result["message"] = f"Deleted directory: {path_str}"
                         else:
                             target.unlink()
@@ -127,7 +143,7 @@ def apply_actions(actions: List[Dict[str, str]], root: Optional[Path] = None) ->
                 if not dest_str:
                      raise FileSystemError(f"Move action requires destination path in 'content' field.")
                 
-                dest_path = validate_path(dest_str, allow_new=True)
+                dest_path = _validate_path_with_cwd(dest_str, cwd)
                 
                 if not target.exists():
                     raise FileSystemError(f"Source file not found: {path_str}")
@@ -136,9 +152,12 @@ def apply_actions(actions: List[Dict[str, str]], root: Optional[Path] = None) ->
                     raise FileSystemError(f"Destination already exists: {dest_str}")
 
                 # Ensure dest parent exists
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
+                ensure_parent(dest_path)
                 
+                moved_dir = target.is_dir()
                 target.rename(dest_path)
+                if moved_dir:
+                    made_dirs.clear()
                 result["status"] = "success"
                 result["message"] = f"Moved: {path_str} -> {dest_str}"
                 
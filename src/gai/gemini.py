@@ -8,7 +8,8 @@ This module is responsible for:
 """
 
 import os
-from typing import Optional
+import functools
+from typing import Optional, Iterator, Tuple, Dict, Any
 
 from google import genai
 from google.genai.types import GenerateContentConfig
@@ -28,6 +29,10 @@ class InvalidAPIKeyError(GeminiError):
     """Raised when the API key is rejected by the service."""
     pass
 
+class CacheNotFoundError(GeminiError):
+    """Raised when a cached_content reference has expired or is otherwise unusable."""
+    pass
+
 
 def _get_api_key() -> str:
     """
@@ -46,9 +51,17 @@ def _get_api_key() -> str:
         )
     return api_key
 
+@functools.lru_cache(maxsize=4)
+def _client_for(api_key: str) -> genai.Client:
+    """
+    Return a shared client per API key, so its HTTP connection pool (and
+    TLS sessions) are reused across requests instead of rebuilt each call.
+    """
+    return genai.Client(api_key=api_key)
+
 def validate_api_key() -> bool:
     """
-    Validate the current API key by making a lightweight request.
+    Validate the current API key with a model listing request.
     
     Returns:
         bool: True if valid, False otherwise.
@@ -58,34 +71,128 @@ def validate_api_key() -> bool:
     """
     api_key = _get_api_key()
     try:
-        client = genai.Client(api_key=api_key)
-        # Simple test: list models (lightweight) or a tiny prompt
-        # Listing models is usually free and fast auth check
-        try:
-             # Just checking if we can init the model object might not trigger auth until send
-             # Let's try a very basic generate
-             client.models.generate_content(
-                model=config.get_model(),
-                contents="test"
-             )
-             return True
-        except Exception:
-             # In some SDK versions, auth error might raise immediately
-             # But generally we catch request errors
-             return False
+        # Listing models is an auth-only metadata call (no billed generation);
+        # fetching the first page is enough to confirm the key works
+        next(iter(_client_for(api_key).models.list()), None)
+        return True
     except Exception:
         return False
 
 
+def create_cache(
+    system_instruction: str,
+    context: str,
+    ttl: str = "300s",
+    model_name: Optional[str] = None
+) -> Optional[str]:
+    """
+    Store a system instruction and a large context block with Gemini's
+    explicit context caching, so later requests only send the new turn.
+
+    Returns:
+        Optional[str]: The cache name, or None if caching is unavailable
+        (e.g. unsupported model or context below the minimum token count).
+    """
+    api_key = _get_api_key()
+
+    if model_name is None:
+        model_name = config.get_model()
+
+    try:
+        client = _client_for(api_key)
+        cache = client.caches.create(
+            model=model_name,
+            config={
+                "system_instruction": system_instruction,
+                "contents": [{"role": "user", "parts": [{"text": context}]}],
+                "ttl": ttl,
+            }
+        )
+        return cache.name
+    except Exception:
+        return None
+
+
+def delete_cache(name: str):
+    """Delete a context cache so it stops being billed. Errors are ignored."""
+    try:
+        _client_for(_get_api_key()).caches.delete(name=name)
+    except Exception:
+        pass
+
+
+def _build_request(
+    parts: Tuple[str, ...],
+    history: Optional[list] = None,
+    system_instruction: Optional[str] = None,
+    cached_content: Optional[str] = None
+) -> Tuple[list, Dict[str, Any]]:
+    """Build the `contents` and `config` arguments of a generate_content call."""
+    contents = []
+    if history:
+        for turn in history:
+            # API expects 'model' role for assistant
+            role = "model" if turn.get("role") == "assistant" else "user"
+            contents.append({
+                "role": role,
+                "parts": [{"text": turn.get("content", "")}]
+            })
+    
+    # Multi-part user turn: large prompt pieces are sent as-is, never concatenated
+    contents.append({
+        "role": "user",
+        "parts": [{"text": part} for part in parts if part]
+    })
+    
+    # Config with system instruction
+    config_args = {}
+    if cached_content:
+        # The system instruction already lives in the cache
+        config_args["cached_content"] = cached_content
+    elif system_instruction:
+        config_args["system_instruction"] = system_instruction
+    
+    return contents, config_args
+
+
+def _wrap_error(e: Exception) -> Exception:
+    """Map an SDK/transport exception to the matching GeminiError subclass."""
+    msg = str(e).lower()
+    
+    # Check for quota/rate limit errors first
+    if "quota" in msg or "rate limit" in msg or "resource_exhausted" in msg:
+        return GeminiError(f"API Quota/Rate Limit Exceeded: {str(e)}\n\nTry switching models with /model command or wait a few minutes.")
+    
+    # A cached_content that expired or was deleted server-side
+    if "cached" in msg and any(hint in msg for hint in ("not found", "404", "expired", "invalid", "permission")):
+        return CacheNotFoundError(f"Context cache unavailable: {str(e)}")
+    
+    # Only treat actual authentication failures as invalid API key
+    # Be very specific to avoid false positives from rate limiting, quota, etc.
+    if "api_key_invalid" in msg or ("403" in msg and "api key" in msg):
+        return InvalidAPIKeyError(f"Invalid API Key: {str(e)}")
+    
+    # Catch other auth-related but not necessarily key issues
+    if "401" in msg or "unauthenticated" in msg:
+        return InvalidAPIKeyError(f"Authentication failed: {str(e)}")
+        
+    if isinstance(e, (APIKeyMissingError, GeminiError)):
+        return e
+    return GeminiError(f"Error communicating with Gemini API: {str(e)}")
+
+
 def generate_response(
-    prompt: str,
+    *parts: str,
     history: Optional[list] = None,
     system_instruction: Optional[str] = None,
-    model_name: Optional[str] = None
+    model_name: Optional[str] = None,
+    cached_content: Optional[str] = None
 ) -> str:
     """
     Generate a response from the Gemini API.
-    Supports multi-turn history and system instructions.
+    The prompt may be given as several parts, which form a single user turn.
+    Supports multi-turn history, system instructions and cached contexts
+    created with `create_cache`.
     """
     # Get API key
     api_key = _get_api_key()
@@ -95,28 +202,8 @@ def generate_response(
     
     try:
         # Initialize the client
-        client = genai.Client(api_key=api_key)
-        
-        # Prepare contents
-        contents = []
-        if history:
-            for turn in history:
-                # API expects 'model' role for assistant
-                role = "model" if turn.get("role") == "assistant" else "user"
-                contents.append({
-                    "role": role,
-                    "parts": [{"text": turn.get("content", "")}]
-                })
-        
-        contents.append({
-            "role": "user",
-            "parts": [{"text": prompt}]
-        })
-        
-        # Config with system instruction
-        config_args = {}
-        if system_instruction:
-            config_args["system_instruction"] = system_instruction
+        client = _client_for(api_key)
+        contents, config_args = _build_request(parts, history, system_instruction, cached_content)
             
         # Generate response
         response = client.models.generate_content(
@@ -132,24 +219,51 @@ def generate_response(
             raise GeminiError("Received empty response from Gemini API")
             
     except Exception as e:
-        msg = str(e).lower()
-        
-        # Check for quota/rate limit errors first
-        if "quota" in msg or "rate limit" in msg or "resource_exhausted" in msg:
-            raise GeminiError(f"API Quota/Rate Limit Exceeded: {str(e)}\n\nTry switching models with /model command or wait a few minutes.")
+        error = _wrap_error(e)
+        if error is e:
+            raise
+        raise error from e
+
+
+def stream_response(
+    *parts: str,
+    history: Optional[list] = None,
+    system_instruction: Optional[str] = None,
+    model_name: Optional[str] = None,
+    cached_content: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Stream a response from the Gemini API, yielding text chunks as they arrive.
+    Takes the same arguments as `generate_response`. Callers may stop
+    iterating early; the underlying request is then abandoned.
+    """
+    api_key = _get_api_key()
+    
+    if model_name is None:
+        model_name = config.get_model()
+    
+    try:
+        client = _client_for(api_key)
+        contents, config_args = _build_request(parts, history, system_instruction, cached_content)
         
-        # Only treat actual authentication failures as invalid API key
-        # Be very specific to avoid false positives from rate limiting, quota, etc.
-        if "api_key_invalid" in msg or ("403" in msg and "api key" in msg):
-            raise InvalidAPIKeyError(f"Invalid API Key: {str(e)}")
+        received = False
+        for chunk in client.models.generate_content_stream(
+            model=model_name,
+            contents=contents,
+            config=config_args
+        ):
+            if chunk.text:
+                received = True
+                yield chunk.text
         
-        # Catch other auth-related but not necessarily key issues
-        if "401" in msg or "unauthenticated" in msg:
-            raise InvalidAPIKeyError(f"Authentication failed: {str(e)}")
+        if not received:
+            raise GeminiError("Received empty response from Gemini API")
             
-        if isinstance(e, (APIKeyMissingError, GeminiError)):
+    except Exception as e:
+        error = _wrap_error(e)
+        if error is e:
             raise
-        raise GeminiError(f"Error communicating with Gemini API: {str(e)}") from e
+        raise error from e
 
 
 class ChatSession:
@@ -164,7 +278,7 @@ class ChatSession:
         else:
             self.model_name = model_name
             
-        self.client = genai.Client(api_key=self.api_key)
+        self.client = _client_for(self.api_key)
         self.chat = self.client.chats.create(model=self.model_name)
         
     def send_message(self, message: str) -> str:
@@ -0,0 +1,83 @@
+"""
+Local response cache for gai-cli.
+Stores validated agent plans in ~/.gai/llm_cache.db, keyed by a hash of
+everything that went into the prompt, so repeating a request on an
+unchanged project skips the Gemini round-trip.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from gai import config
+
+CACHE_FILE_NAME = "llm_cache.db"
+
+# Keep only the most recent plans
+MAX_ENTRIES = 256
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[Path] = None
+
+def _connect() -> sqlite3.Connection:
+    """Open (once) the cache database in the global config directory."""
+    global _conn, _conn_path
+    cache_file = config.CONFIG_DIR / CACHE_FILE_NAME
+    if _conn is not None and _conn_path == cache_file:
+        return _conn
+
+    config.CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(cache_file), check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS plans ("
+        "key TEXT PRIMARY KEY, plan TEXT NOT NULL, created REAL NOT NULL)"
+    )
+    _conn, _conn_path = conn, cache_file
+    return conn
+
+def make_key(*parts: str) -> str:
+    """Build a cache key from the prompt inputs (model, prompt, context, request...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Return the cached plan for key, or None."""
+    try:
+        row = _connect().execute("SELECT plan FROM plans WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except (sqlite3.Error, json.JSONDecodeError):
+        return None
+
+def put(key: str, plan: Dict[str, Any]):
+    """Store a validated plan and evict the oldest entries beyond MAX_ENTRIES."""
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO plans (key, plan, created) VALUES (?, ?, ?)",
+                (key, json.dumps(plan), time.time())
+            )
+            conn.execute(
+                "DELETE FROM plans WHERE key NOT IN "
+                "(SELECT key FROM plans ORDER BY created DESC LIMIT ?)",
+                (MAX_ENTRIES,)
+            )
+    except (sqlite3.Error, TypeError, ValueError):
+        # Caching is best-effort; never fail a plan because of it
+        pass
+
+def discard(key: str):
+    """Remove a cached plan (e.g. after the user rejected it)."""
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+    except sqlite3.Error:
+        pass
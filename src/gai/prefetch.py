@@ -0,0 +1,37 @@
+"""
+Background prefetching for gai-cli.
+Warms the scanner cache while the user reads output or types the next
+request, so the following agent turn does not wait on a full project scan.
+"""
+
+import threading
+from typing import Optional
+
+from gai import scanner
+
+# At most one background scan (scans share the scanner cache). A daemon
+# thread, so /exit or Ctrl-C never waits for a scan of a large tree.
+_thread: Optional[threading.Thread] = None
+
+def _scan():
+    try:
+        scanner.scan_project()
+    except Exception:
+        # Errors are ignored; the caller rescans
+        pass
+
+def prefetch_project_context():
+    """Start scanning the project in the background, unless a scan is already running."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _thread = threading.Thread(target=_scan, name="gai-prefetch", daemon=True)
+    _thread.start()
+
+def wait_for_prefetch():
+    """Wait for a pending background scan."""
+    global _thread
+    if _thread is None:
+        return
+    _thread.join()
+    _thread = None
@@ -4,22 +4,44 @@ Recursively analyzes the project structure to build context for the agent.
 """
 
 import os
+import re
+import fnmatch
+import itertools
+from collections import deque
 import json
 from pathlib import Path
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Tuple, Optional, TYPE_CHECKING
 
 from gai.fs import IGNORED_DIRS
 from gai import config
 
+if TYPE_CHECKING:  # Optional: callers build the gitignore matcher
+    import pathspec
+
 # Skip files larger than this (bytes)
 MAX_FILE_SIZE = 50_000 
 
 # Extensions to include in context
-ALLOWED_EXTENSIONS = {
+ALLOWED_EXTENSIONS = frozenset({
     '.py', '.js', '.ts', '.tsx', '.jsx', '.html', '.css', '.json', 
     '.yaml', '.yml', '.toml', '.md', '.txt', '.sh', '.bat', 
     '.dart', '.go', '.rs', '.java', '.c', '.cpp', '.h'
-}
+})
+
+# Tuple so a single str.endswith call checks every extension
+_ALLOWED_SUFFIXES = tuple(sorted(ALLOWED_EXTENSIONS))
+
+# Glob patterns for generated directories whose names vary (matched in
+# addition to the exact names in IGNORED_DIRS)
+IGNORED_DIR_PATTERNS = ("*.egg-info",)
+
+# All patterns compiled into one regex, built once at import. None when there
+# are no patterns (an empty regex would match, and prune, every directory)
+_IGNORED_DIR_RE = (
+    re.compile("|".join(fnmatch.translate(p) for p in IGNORED_DIR_PATTERNS))
+    if IGNORED_DIR_PATTERNS else None
+)
 
 def is_ignored(path: Path) -> bool:
     """Check if path contains any ignored directories."""
@@ -28,86 +50,264 @@ def is_ignored(path: Path) -> bool:
             return True
     return False
 
-# Max total context size (chars) to avoid token limit
+# Dotfiles that are still worth showing the agent
+_HIDDEN_ALLOW = frozenset({".env.example", ".gitignore"})
+
+# Dot-directories that hold project files (CI workflows etc.) and are walked
+_HIDDEN_DIR_ALLOW = frozenset({".github", ".gitlab", ".circleci", ".devcontainer"})
+
+# Files under any of these directories are read first
+PRIORITY_DIRS = frozenset({"src", "tests", "lib", "app"})
+
+# Max total size of file contents (bytes) to avoid token limit
 MAX_CONTEXT_SIZE = 100_000
 
-def scan_project(root: str = ".", force_rescan: bool = False) -> str:
+# Files with a NUL byte in their first BINARY_PROBE_SIZE bytes are treated as binary
+BINARY_PROBE_SIZE = 512
+
+# Threads used to read file contents concurrently
+READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Last scan result, reused while no scanned file (or the project state) changed
+_CACHE: Dict[str, Any] = {"key": None, "value": None}
+
+def _stat_key(path: Path) -> tuple:
+    """Return (mtime_ns, size) for path, or None if it cannot be stat'ed."""
+    try:
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _walk(root: str, spec: Optional["pathspec.PathSpec"] = None) -> Iterator[Tuple[str, os.DirEntry]]:
     """
-    Scan the project and return a formatted context string.
-    Caches the structure in .gai/structure.json to save tokens.
+    Yield (relative path, DirEntry) for every file under root, top-down like
+    os.walk, without descending into IGNORED_DIRS, IGNORED_DIR_PATTERNS,
+    hidden (dot) directories other than _HIDDEN_DIR_ALLOW, or symlinked
+    directories.
+    File types come from the directory listing itself (no extra stat);
+    only symlinks need one to tell files from directories.
+    Paths matched by spec (e.g. a gitignore PathSpec) are pruned as well;
+    directories are matched with a trailing slash, as git does.
+    """
+    stack = [("", root)]
+    while stack:
+        prefix, path = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        name = entry.name
+                        if ((name[:1] != "." or name in _HIDDEN_DIR_ALLOW)
+                                and name not in IGNORED_DIRS
+                                and (_IGNORED_DIR_RE is None or not _IGNORED_DIR_RE.match(name))):
+                            rel_dir = prefix + name + "/"
+                            if spec is None or not spec.match_file(rel_dir):
+                                subdirs.append((rel_dir, entry.path))
+                    elif entry.is_file():
+                        rel_file = prefix + entry.name
+                        if spec is None or not spec.match_file(rel_file):
+                            yield rel_file, entry
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+def _read_bytes(path: str, size: int) -> Optional[bytes]:
+    """
+    Read up to size bytes (the size from the walk's stat) with raw os.read,
+    skipping the buffered file object and its extra fstat/lseek calls.
+    Returns None if the file cannot be read or looks binary.
     """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0) | getattr(os, "O_CLOEXEC", 0))
+    except OSError:
+        return None
+    try:
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = os.read(fd, remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+        # Mislabeled binaries (e.g. a blob named .txt) would only decode to noise
+        if data.find(b"\0", 0, BINARY_PROBE_SIZE) != -1:
+            return None
+        return data
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+def _collect(root: str, spec: Optional["pathspec.PathSpec"] = None) -> tuple:
+    """
+    Walk the project once, skipping paths matched by spec.
+
+    Returns:
+        (root_path, all_files, priority_files, other_files, cache_key), where
+        each file is (rel_path, abs_path, size, priority) and cache_key changes
+        whenever a file is added, removed or modified (mtime/size).
+    """
+    # pathlib only for resolving the root; the walk itself works on strings
     root_path = Path(root).resolve()
-    project_dir = config.get_project_dir()
-    cache_file = project_dir / "structure.json"
+    root_str = str(root_path)
     
-    # 1. Quick pass for all visible files
     all_files = []
-    PRIORITY_DIRS = {"src", "tests", "lib", "app"}
+    # Partitioned as we go, so content selection needs no extra pass
+    priority_files = []
+    other_files = []
+    fingerprint = []
+    # Directory prefix -> whether any of its parts is a priority dir
+    priority_prefixes: Dict[str, bool] = {}
+    # Locals for the hot loop
+    hidden_allow = _HIDDEN_ALLOW
+    priority_dirs = PRIORITY_DIRS
     
-    for dirpath, dirnames, filenames in os.walk(root_path):
-        dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
-        current_dir = Path(dirpath)
-        rel_dir = current_dir.relative_to(root_path)
-        prefix = "" if rel_dir == Path(".") else str(rel_dir) + "/"
-        
-        for f in filenames:
-            if f.startswith(".") and f not in [".env.example", ".gitignore", "pyproject.toml", "package.json"]:
-                continue
-            rel_file = prefix + f
-            is_priority = any(part in PRIORITY_DIRS for part in Path(rel_file).parts)
-            all_files.append({"rel_path": rel_file, "priority": is_priority})
+    for rel_file, entry in _walk(root_str, spec):
+        f = entry.name
+        if f[:1] == "." and f not in hidden_allow:
+            continue
+        try:
+            st = entry.stat()
+            stat_key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat_key = None
+        prefix = rel_file[:len(rel_file) - len(f)]
+        dir_priority = priority_prefixes.get(prefix)
+        if dir_priority is None:
+            dir_priority = not priority_dirs.isdisjoint(prefix.split("/"))
+            priority_prefixes[prefix] = dir_priority
+        is_priority = dir_priority or f in priority_dirs
+        info = (rel_file, entry.path, stat_key[1] if stat_key else None, is_priority)
+        all_files.append(info)
+        (priority_files if is_priority else other_files).append(info)
+        fingerprint.append((rel_file, stat_key))
+
+    cache_key = hash((root_str, tuple(fingerprint), _stat_key(config.get_state_file())))
+    return root_path, all_files, priority_files, other_files, cache_key
 
-    # 2. Update Cache
-    cache_data = {"structure": all_files}
+def _iter_context(root_path: Path, all_files: list, priority_files: list, other_files: list) -> Iterator[bytes]:
+    """
+    Yield the UTF-8 context piece by piece: header and structure, then each
+    file's fence opening, raw contents and fence closing. At most
+    READ_WORKERS file bodies are in memory (read or in flight) at a time.
+    """
+    # 1. Update Cache
+    cache_file = config.get_project_dir() / "structure.json"
+    cache_data = {"structure": [{"rel_path": f[0], "priority": f[3]} for f in all_files]}
     cache_file.write_text(json.dumps(cache_data, indent=2), encoding="utf-8")
 
-    # 3. Load Project State (The Brain)
+    # 2. Load Project State (The Brain)
     project_state = config.load_state()
 
-    # 4. Construct Context
-    context_parts = []
-    context_parts.append("## Project Context")
-    context_parts.append(f"Root: {root_path.name}")
+    # 3. Header and structure listing
+    lines = ["## Project Context", f"Root: {root_path.name}"]
     
     if project_state:
-        context_parts.append("\n## Project Brain (Internal State)")
-        context_parts.append(f"Last Task: {project_state.get('last_task', 'N/A')}")
-        context_parts.append(f"Status: {project_state.get('status', 'N/A')}")
+        lines.append("\n## Project Brain (Internal State)")
+        lines.append(f"Last Task: {project_state.get('last_task', 'N/A')}")
+        lines.append(f"Status: {project_state.get('status', 'N/A')}")
         if project_state.get('errors'):
-            context_parts.append(f"Remaining Errors: {', '.join(project_state.get('errors'))}")
-        context_parts.append("")
+            lines.append(f"Remaining Errors: {', '.join(project_state.get('errors'))}")
+        lines.append("")
 
-    context_parts.append("Structure:")
-    for f in all_files:
-        context_parts.append(f"- {f['rel_path']}")
+    lines.append("Structure:")
+    lines.extend(f"- {f[0]}" for f in all_files)
         
-    context_parts.append("\n## File Contents")
-    
     # Second pass: Collect content, prioritizing priority files
     # Only read priority files by default to save tokens, OR all if small enough
     total_size = 0
-    file_contents = []
-    
-    # Group files by priority
-    priority_files = [f for f in all_files if f['priority']]
-    other_files = [f for f in all_files if not f['priority']]
     
-    # Read files until MAX_CONTEXT_SIZE reached
-    for f_info in priority_files + other_files:
-        rel_path = f_info['rel_path']
-        file_path = root_path / rel_path
-        
-        if file_path.suffix in ALLOWED_EXTENSIONS:
-            try:
-                stats = file_path.stat()
-                if stats.st_size <= MAX_FILE_SIZE:
-                    content = file_path.read_text(encoding="utf-8", errors="ignore")
-                    if total_size + len(content) > MAX_CONTEXT_SIZE:
-                        continue
-                    file_contents.append(f"\n### File: {rel_path}\n```{file_path.suffix[1:]}\n{content}\n```")
-                    total_size += len(content)
-            except Exception:
-                pass
-
-    context_parts.extend(file_contents)
-    return "\n".join(context_parts)
+    # Pick files until MAX_CONTEXT_SIZE is reached (sizes come from the first pass,
+    # so files that cannot fit are never opened)
+    selected = []
+    planned_size = 0
+    omitted = 0
+    for rel_path, abs_path, size, _ in itertools.chain(priority_files, other_files):
+        if rel_path.endswith(_ALLOWED_SUFFIXES) and size is not None and size <= MAX_FILE_SIZE:
+            if planned_size + size > MAX_CONTEXT_SIZE:
+                omitted += 1
+                continue
+            planned_size += size
+            # Fence language from the extension
+            selected.append((rel_path, abs_path, size, rel_path.rpartition(".")[2]))
+
+    lines.append("\n## File Contents")
+    if omitted:
+        # Still listed under Structure; the agent can ask for them by name
+        lines.append(f"({omitted} files omitted: context size limit of {MAX_CONTEXT_SIZE} bytes reached)")
+    yield ("\n".join(lines) + "\n").encode("utf-8")
+    del lines
+
+    # 4. File blocks. Reads are I/O bound and release the GIL, so overlap
+    # them, but keep only a window of READ_WORKERS reads submitted ahead
+    # (executor.map would submit, and hold, every read up front)
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        pending = iter(selected)
+        window = deque(
+            (f, executor.submit(_read_bytes, f[1], f[2]))
+            for f in itertools.islice(pending, READ_WORKERS)
+        )
+        while window:
+            (rel_path, _, _, ext), future = window.popleft()
+            nxt = next(pending, None)
+            if nxt is not None:
+                window.append((nxt, executor.submit(_read_bytes, nxt[1], nxt[2])))
+            data = future.result()
+            if data is None or total_size + len(data) > MAX_CONTEXT_SIZE:
+                continue
+            total_size += len(data)
+            yield f"\n### File: {rel_path}\n```{ext}\n".encode("utf-8")
+            yield data
+            del data
+            yield b"\n```\n"
+
+def iter_scan_project(
+    root: str = ".",
+    force_rescan: bool = False,
+    *,
+    spec: Optional["pathspec.PathSpec"] = None
+) -> Iterator[str]:
+    """
+    Like scan_project, but yield the context in pieces (header and structure
+    first, then each file's block) as they are read, so callers can stream
+    it without holding every file body at once. "".join() of the pieces
+    equals scan_project(). Streamed results are not memoized.
+    """
+    root_path, all_files, priority_files, other_files, cache_key = _collect(root, spec)
+    if not force_rescan and _CACHE["key"] == cache_key:
+        yield _CACHE["value"]
+        return
+    for piece in _iter_context(root_path, all_files, priority_files, other_files):
+        yield piece.decode("utf-8", "ignore")
+
+def scan_project(
+    root: str = ".",
+    force_rescan: bool = False,
+    *,
+    spec: Optional["pathspec.PathSpec"] = None
+) -> str:
+    """
+    Scan the project and return a formatted context string.
+    Caches the structure in .gai/structure.json to save tokens.
+    The result is memoized and only rebuilt when a file is added, removed
+    or modified (mtime/size), or when force_rescan is set.
+
+    spec is an optional precompiled matcher with a match_file(rel_path)
+    method, such as pathspec.PathSpec.from_lines("gitwildmatch", lines);
+    matching files and directories are left out of the scan.
+    """
+    root_path, all_files, priority_files, other_files, cache_key = _collect(root, spec)
+    if not force_rescan and _CACHE["key"] == cache_key:
+        return _CACHE["value"]
+
+    # Build directly into one byte buffer and decode once
+    buf = bytearray()
+    for piece in _iter_context(root_path, all_files, priority_files, other_files):
+        buf.extend(piece)
+    context = buf.decode("utf-8", "ignore")
+    _CACHE.update(key=cache_key, value=context)
+    return context
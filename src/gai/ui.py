@@ -3,6 +3,7 @@ Centralized UI styling for gai-cli.
 Provides a consistent, premium look and feel using Rich.
 """
 
+import time
 from rich.console import Console
 from rich.theme import Theme
 from rich.console import Console
@@ -15,6 +16,8 @@ from rich.table import Table
 from rich.prompt import Confirm
 from rich import box
 from rich.syntax import Syntax
+from rich.live import Live
+from typing import Iterable
 
 from gai import config, languages, themes
 
@@ -140,6 +143,16 @@ def print_system(message: str):
     """Print a muted system message with the Claude-style icon."""
     console.print(f"  [accent]⎿  {message}[/accent]")
 
+def print_action_results(results: list):
+    """Print file action results (see fs.apply_actions) in a single render pass."""
+    lines = [
+        f"  [success]⎿  ✔ {res['message']}[/success]" if res["status"] == "success"
+        else f"  [error]⎿  ✖ {res['message']}[/error]"
+        for res in results
+    ]
+    if lines:
+        console.print("\n".join(lines))
+
 def print_plan(plan: dict):
     """Display the proposed agent plan with a structured boxed layout."""
     console.print()
@@ -209,6 +222,21 @@ def confirm_plan(message: str = None) -> bool:
     console.print()
     return Confirm.ask(f"  [warning]⚡ {message}[/warning]")
 
+def _ai_subtitle() -> str:
+    return f"[dim]Powered by {config.get_model()}[/dim]"
+
+def _ai_panel(content: str, subtitle: str = None) -> Panel:
+    """Boxed Markdown panel used for Gemini replies."""
+    return Panel(
+        Markdown(content),
+        title="[ai] Gemini [/ai]",
+        title_align="left",
+        border_style="ai",
+        padding=(1, 2),
+        subtitle=subtitle or _ai_subtitle(),
+        subtitle_align="right"
+    )
+
 def print_message(sender: str, content: str, style: str = "white"):
     """
     Print a chat message in a clean conversation style with Claude-like panels.
@@ -222,16 +250,7 @@ def print_message(sender: str, content: str, style: str = "white"):
     elif sender.lower() == "gemini":
         console.print()
         # Boxed AI response
-        md = Markdown(content)
-        console.print(Panel(
-            md,
-            title="[ai] Gemini [/ai]",
-            title_align="left",
-            border_style="ai",
-            padding=(1, 2),
-            subtitle=f"[dim]Powered by {config.get_model()}[/dim]",
-            subtitle_align="right"
-        ))
+        console.print(_ai_panel(content))
     else:
         # System/Agent messages
         console.print()
@@ -244,6 +263,34 @@ def print_message(sender: str, content: str, style: str = "white"):
 
     console.print()
 
+# Redraws per second while a reply streams in
+STREAM_REFRESH_PER_SECOND = 8
+
+def stream_message(chunks: Iterable[str]) -> str:
+    """
+    Render a streamed Gemini reply live, in the same panel as print_message.
+    Returns the full response text.
+    """
+    parts = []
+    subtitle = _ai_subtitle()
+    # Re-parse the Markdown at most once per interval, not on every chunk
+    interval = 1 / STREAM_REFRESH_PER_SECOND
+    next_render = 0.0
+    console.print()
+    # Default "ellipsis" overflow while streaming; Live.stop() prints the
+    # final frame in full
+    with Live(_ai_panel("...", subtitle), console=console, refresh_per_second=STREAM_REFRESH_PER_SECOND) as live:
+        for chunk in chunks:
+            parts.append(chunk)
+            now = time.monotonic()
+            if now >= next_render:
+                live.update(_ai_panel("".join(parts), subtitle))
+                next_render = now + interval
+        content = "".join(parts)
+        live.update(_ai_panel(content, subtitle))
+    console.print()
+    return content
+
 def create_spinner(message: str = None):
     """Create a status spinner with a clean look."""
     if message is None:
@@ -0,0 +1,158 @@
+import time
+import contextlib
+import pytest
+from gai import agent, config, gemini
+
+def test_extract_dict_span_ignores_braces_in_strings():
+    text = "Here's the plan:\n{'plan': 'p', 'content': '''def f():\n    return {'a': \"}\"}\n'''}\ntrailing }"
+    assert agent._extract_dict_span(text) == text[text.index("{"):text.rindex("'''}") + 4]
+
+def test_extract_dict_span_unbalanced():
+    assert agent._extract_dict_span("no dict here") is None
+    assert agent._extract_dict_span("{'plan': 'unterminated") is None
+
+def test_parse_plan_json_and_literal():
+    json_text = '{"reasoning": "r", "plan": "p", "actions": [{"action": "create", "path": "a.py", "content": "x = {}"}]}'
+    assert agent.parse_plan(json_text)["actions"][0]["content"] == "x = {}"
+
+    literal_text = "```python\n{'reasoning': 'r', 'plan': ['p'], 'actions': [{'action': 'create', 'path': 'a.py', 'content': '''print(\"}\")'''}]}\n```"
+    assert agent.parse_plan(literal_text)["actions"][0]["content"] == 'print("}")'
+
+def test_dict_span_scanner_incremental():
+    text = "```python\n{'plan': 'p', 'content': '''a = {\"x\": '}'}\\n'''}\n```\ntrailing"
+    expected = agent._extract_dict_span(text)
+    assert expected is not None
+
+    span_scanner = agent._DictSpanScanner()
+    span = None
+    for ch in text:
+        span = span_scanner.feed(ch)
+        if span:
+            break
+    assert span == expected
+
+def test_clean_llm_response_strips_fence():
+    assert agent.clean_llm_response("```python\n{'a': 1}\n```\n") == "{'a': 1}"
+    assert agent.clean_llm_response("  {'a': 1}  ") == "{'a': 1}"
+
+def test_validate_plan():
+    assert agent.validate_plan({"reasoning": "r", "plan": ["p"], "actions": [{"action": "delete", "path": "a"}]})
+    assert not agent.validate_plan({"reasoning": "r", "plan": "p"})
+    assert not agent.validate_plan({"reasoning": 1, "plan": "p", "actions": []})
+    assert not agent.validate_plan({"reasoning": "r", "plan": "p", "actions": [{"action": "delete"}]})
+    assert not agent.validate_plan(["not", "a", "dict"])
+
+PLAN_TEXT = "{'reasoning': 'r', 'plan': 'p', 'actions': []}"
+
+@pytest.fixture
+def planner(tmp_path, monkeypatch):
+    """generate_plan with the scanner, UI and Gemini calls replaced by recorders."""
+    calls = {"create_cache": 0, "deleted": [], "streams": [], "system": []}
+    state = {"context": "x" * agent.CONTEXT_CACHE_MIN_CHARS, "responses": []}
+
+    def create_cache(system_instruction, context, ttl="300s", model_name=None):
+        calls["create_cache"] += 1
+        return state.get("cache_name")
+
+    def stream_response(*parts, history=None, system_instruction=None, cached_content=None):
+        calls["streams"].append({"parts": parts, "cached_content": cached_content, "consumed": 0})
+        response = state["responses"].pop(0)
+        if isinstance(response, Exception):
+            raise response
+        for chunk in response:
+            calls["streams"][-1]["consumed"] += 1
+            yield chunk
+
+    monkeypatch.setattr(config, "CONFIG_DIR", tmp_path / ".gai")
+    monkeypatch.setattr(config, "get_model", lambda: "test-model")
+    monkeypatch.setattr(agent.prefetch, "wait_for_prefetch", lambda: None)
+    monkeypatch.setattr(agent.scanner, "scan_project", lambda: state["context"])
+    monkeypatch.setattr(agent.ui, "create_spinner", lambda *a, **k: contextlib.nullcontext())
+    monkeypatch.setattr(agent.ui, "print_system", calls["system"].append)
+    monkeypatch.setattr(agent.ui, "print_error", lambda *a: None)
+    monkeypatch.setattr(gemini, "create_cache", create_cache)
+    monkeypatch.setattr(gemini, "stream_response", stream_response)
+    monkeypatch.setattr(gemini, "delete_cache", calls["deleted"].append)
+    monkeypatch.setattr(agent, "_context_cache", {"key": None, "name": None, "expires": 0.0, "seen": None})
+    monkeypatch.setattr(agent, "_cache_unavailable", {})
+    return calls, state
+
+def test_generate_plan_uses_context_cache_and_stops_early(planner):
+    calls, state = planner
+    state["cache_name"] = "cachedContents/1"
+    agent.get_context_cache(state["context"])  # first use goes inline
+    state["responses"] = [[PLAN_TEXT[:10], PLAN_TEXT[10:], "never read", "never read"]]
+
+    assert agent.generate_plan("do it")["plan"] == "p"
+    stream = calls["streams"][0]
+    assert stream["cached_content"] == "cachedContents/1"
+    assert state["context"] not in stream["parts"]
+    assert stream["consumed"] == 2
+
+def test_generate_plan_reuses_llm_cache(planner):
+    calls, state = planner
+    state["responses"] = [[PLAN_TEXT]]
+    first = agent.generate_plan("do it")
+
+    assert agent.generate_plan("do it") == first
+    assert len(calls["streams"]) == 1
+
+def test_generate_plan_expired_cache_falls_back_inline(planner):
+    calls, state = planner
+    state["cache_name"] = "cachedContents/1"
+    agent.get_context_cache(state["context"])  # first use goes inline
+    state["responses"] = [gemini.CacheNotFoundError("404 cachedcontent not found"), [PLAN_TEXT]]
+
+    assert agent.generate_plan("do it")["plan"] == "p"
+    assert [s["cached_content"] for s in calls["streams"]] == ["cachedContents/1", None]
+    assert state["context"] in calls["streams"][1]["parts"]
+    assert not any("Retrying" in msg for msg in calls["system"])
+
+def test_generate_plan_other_errors_keep_cache(planner):
+    calls, state = planner
+    state["cache_name"] = "cachedContents/1"
+    agent.get_context_cache(state["context"])  # first use goes inline
+    state["responses"] = [gemini.GeminiError("429 RESOURCE_EXHAUSTED")]
+
+    assert agent.generate_plan("do it") is None
+    assert len(calls["streams"]) == 1
+    assert agent._context_cache["name"] == "cachedContents/1"
+
+def test_context_cache_failure_remembered_per_model(planner):
+    calls, state = planner
+    for ctx in ("a", "a", "b", "b"):
+        assert agent.get_context_cache(ctx * agent.CONTEXT_CACHE_MIN_CHARS) is None
+    assert calls["create_cache"] == 1
+
+def test_context_cache_created_on_reuse_and_old_one_deleted(planner):
+    calls, state = planner
+    state["cache_name"] = "cachedContents/1"
+    a, b = "a" * agent.CONTEXT_CACHE_MIN_CHARS, "b" * agent.CONTEXT_CACHE_MIN_CHARS
+    assert agent.get_context_cache(a) is None
+    assert calls["create_cache"] == 0
+    assert agent.get_context_cache(a) == "cachedContents/1"
+    assert agent.get_context_cache(a) == "cachedContents/1"
+    assert calls["create_cache"] == 1
+
+    # A new context (e.g. after an applied plan) supersedes the cache
+    assert agent.get_context_cache(b) is None
+    for _ in range(50):
+        if calls["deleted"]:
+            break
+        time.sleep(0.01)
+    assert calls["deleted"] == ["cachedContents/1"]
+
+def test_generate_plan_caches_context_for_retry(planner):
+    calls, state = planner
+    state["cache_name"] = "cachedContents/1"
+    state["responses"] = [["not a plan"], [PLAN_TEXT]]
+
+    assert agent.generate_plan("do it")["plan"] == "p"
+    assert [s["cached_content"] for s in calls["streams"]] == [None, "cachedContents/1"]
+    assert calls["create_cache"] == 1
+
+def test_small_context_not_cached(planner):
+    calls, state = planner
+    state["cache_name"] = "cachedContents/1"
+    assert agent.get_context_cache("small") is None
+    assert calls["create_cache"] == 0
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+import pytest
+from gai import chat
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses sh")
+def test_run_tests_timeout_kills_grandchildren(monkeypatch):
+    monkeypatch.setattr(chat, "TEST_TIMEOUT", 1)
+    start = time.monotonic()
+    returncode, log = chat.run_tests(["sh", "-c", "echo start; sleep 8 & wait"])
+    assert time.monotonic() - start < 5
+    assert returncode == 1
+    assert "start" in log
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses sh")
+def test_run_tests_interrupt_kills_child(monkeypatch):
+    pids = []
+
+    def interrupt(line, **kwargs):
+        pids.append(int(line))
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(chat.ui.console, "out", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        chat.run_tests(["sh", "-c", "echo $$; sleep 30"])
+    with pytest.raises(ProcessLookupError):
+        os.kill(pids[0], 0)
+
+def test_run_tests_captures_output():
+    returncode, log = chat.run_tests([sys.executable, "-c", "print('ok'); raise SystemExit(3)"])
+    assert returncode == 3
+    assert log.strip() == "ok"
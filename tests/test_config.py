@@ -36,3 +36,92 @@ def test_get_model_default():
     # User may have a different model configured
     default = config.DEFAULT_MODEL
     assert default == "gemini-2.0-flash-exp"
+
+def test_load_config_cached_until_file_changes(tmp_path, monkeypatch):
+    mock_dir = tmp_path / ".gai"
+    mock_config = mock_dir / "config.json"
+    monkeypatch.setattr(config, "CONFIG_DIR", mock_dir)
+    monkeypatch.setattr(config, "CONFIG_FILE", mock_config)
+
+    config.save_theme("dark")
+    assert config.get_theme() == "dark"
+
+    # External edit is picked up
+    mock_config.write_text(json.dumps({"theme": "light", "language": "tr"}))
+    assert config.get_theme() == "light"
+
+    # Returned dicts are copies; mutating them doesn't leak into the cache
+    config._load_config()["theme"] = "mutated"
+    assert config.get_theme() == "light"
+
+def test_batch_defers_write(tmp_path, monkeypatch):
+    mock_dir = tmp_path / ".gai"
+    mock_config = mock_dir / "config.json"
+    monkeypatch.setattr(config, "CONFIG_DIR", mock_dir)
+    monkeypatch.setattr(config, "CONFIG_FILE", mock_config)
+
+    with config.batch():
+        config.save_theme("dark")
+        config.save_language("tr")
+        assert not mock_config.exists()
+        assert config.get_theme() == "dark"
+
+    assert json.loads(mock_config.read_text()) == {"theme": "dark", "language": "tr"}
+
+def test_append_history_jsonl(tmp_path):
+    turn = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    config.append_history(turn, root=tmp_path)
+    config.append_history(turn[:1], root=tmp_path)
+
+    assert config.load_history(root=tmp_path) == turn + turn[:1]
+    assert len(config.get_history_file(tmp_path).read_text().splitlines()) == 3
+
+    config.clear_history(root=tmp_path)
+    assert config.load_history(root=tmp_path) == []
+
+def test_append_history_migrates_legacy_json(tmp_path):
+    legacy = config.get_history_file(tmp_path).with_suffix(".json")
+    legacy.write_text(json.dumps([{"role": "user", "content": "old"}]))
+    assert config.load_history(root=tmp_path) == [{"role": "user", "content": "old"}]
+
+    config.append_history([{"role": "user", "content": "new"}], root=tmp_path)
+    assert not legacy.exists()
+    assert [e["content"] for e in config.load_history(root=tmp_path)] == ["old", "new"]
+
+def test_state_roundtrip_compact(tmp_path):
+    state = {"last_task": "fix ü", "errors": ["a"]}
+    config.save_state(state, root=tmp_path)
+    assert config.load_state(root=tmp_path) == state
+    assert b"\n" not in config.get_state_file(tmp_path).read_bytes()
+
+def test_save_config_is_atomic(tmp_path, monkeypatch):
+    mock_dir = tmp_path / ".gai"
+    monkeypatch.setattr(config, "CONFIG_DIR", mock_dir)
+    monkeypatch.setattr(config, "CONFIG_FILE", mock_dir / "config.json")
+
+    config.save_theme("dark")
+    config.save_theme("light")
+
+    assert config.get_theme() == "light"
+    assert os.listdir(mock_dir) == ["config.json"]
+
+def test_load_history_skips_torn_multibyte_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "orjson", None)
+    config.append_history([{"role": "user", "content": "ok"}], root=tmp_path)
+    hfile = config.get_history_file(tmp_path)
+    with open(hfile, "ab") as f:
+        f.write('{"role":"user","content":"ğ'.encode("utf-8")[:-1] + b"\n")
+    assert config.load_history(root=tmp_path) == [{"role": "user", "content": "ok"}]
+
+def test_failed_save_not_cached(tmp_path, monkeypatch):
+    mock_dir = tmp_path / ".gai"
+    monkeypatch.setattr(config, "CONFIG_DIR", mock_dir)
+    monkeypatch.setattr(config, "CONFIG_FILE", mock_dir / "config.json")
+    config.save_theme("dark")
+
+    def fail(path, data):
+        raise OSError("disk full")
+    monkeypatch.setattr(config, "_atomic_write", fail)
+    with pytest.raises(OSError):
+        config.save_theme("light")
+    assert config.get_theme() == "dark"
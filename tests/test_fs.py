@@ -19,6 +19,15 @@ def test_validate_path_unsafe():
     with pytest.raises(fs.UnsafePathError):
         fs.validate_path(unsafe_path)
 
+def test_validate_path_sibling_and_ignored(tmp_path):
+    root = tmp_path / "proj"
+    root.mkdir()
+    # Shares a string prefix with root but is outside it
+    with pytest.raises(fs.UnsafePathError):
+        fs.validate_path(tmp_path / "proj2" / "a.py", root=root)
+    with pytest.raises(fs.UnsafePathError, match=r"\.git"):
+        fs.validate_path(root / ".git" / "config", root=root)
+
 def test_apply_actions_create_delete(tmp_path, monkeypatch):
     # Mock CWD to tmp_path for safety during test
     monkeypatch.chdir(tmp_path)
@@ -36,3 +45,13 @@ def test_apply_actions_create_delete(tmp_path, monkeypatch):
     delete_actions = [{"action": "delete", "path": test_file}]
     fs.apply_actions(delete_actions)
     assert not (tmp_path / test_file).exists()
+
+def test_apply_actions_recreates_deleted_parent(tmp_path):
+    actions = [
+        {"action": "create", "path": str(tmp_path / "pkg" / "a.py"), "content": "a"},
+        {"action": "delete", "path": str(tmp_path / "pkg")},
+        {"action": "create", "path": str(tmp_path / "pkg" / "b.py"), "content": "b"},
+    ]
+    results = fs.apply_actions(actions, root=tmp_path)
+    assert [r["status"] for r in results] == ["success"] * 3
+    assert (tmp_path / "pkg" / "b.py").read_text() == "b"
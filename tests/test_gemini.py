@@ -2,6 +2,13 @@ import pytest
 from unittest.mock import MagicMock
 from gai import gemini, config
 
+@pytest.fixture(autouse=True)
+def fresh_client():
+    # Clients are cached per API key; make every test build its own mock
+    gemini._client_for.cache_clear()
+    yield
+    gemini._client_for.cache_clear()
+
 def test_generate_response_mock(monkeypatch):
     # Mock the GenAI Client
     mock_client = MagicMock()
@@ -20,3 +27,91 @@ def test_gemini_missing_key(monkeypatch):
     monkeypatch.setattr(config, "get_api_key", lambda: None)
     with pytest.raises(gemini.APIKeyMissingError):
         gemini.generate_response("Hello")
+
+def test_generate_response_cached_content(monkeypatch):
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value.text = "Cached Response"
+
+    monkeypatch.setattr("google.genai.Client", lambda api_key: mock_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    response = gemini.generate_response(
+        "Hello", system_instruction="sys", cached_content="cachedContents/123"
+    )
+    assert response == "Cached Response"
+    _, kwargs = mock_client.models.generate_content.call_args
+    assert kwargs["config"] == {"cached_content": "cachedContents/123"}
+
+def test_create_cache_unavailable(monkeypatch):
+    mock_client = MagicMock()
+    mock_client.caches.create.side_effect = Exception("400 cached content is too small")
+
+    monkeypatch.setattr("google.genai.Client", lambda api_key: mock_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    assert gemini.create_cache("sys", "context") is None
+
+def test_stream_response_mock(monkeypatch):
+    mock_client = MagicMock()
+    chunks = [MagicMock(text="Hel"), MagicMock(text=None), MagicMock(text="lo")]
+    mock_client.models.generate_content_stream.return_value = iter(chunks)
+
+    monkeypatch.setattr("google.genai.Client", lambda api_key: mock_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    assert list(gemini.stream_response("Hello")) == ["Hel", "lo"]
+
+def test_generate_response_multipart(monkeypatch):
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value.text = "ok"
+
+    monkeypatch.setattr("google.genai.Client", lambda api_key: mock_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    gemini.generate_response("context", "request", "")
+    _, kwargs = mock_client.models.generate_content.call_args
+    assert kwargs["contents"] == [
+        {"role": "user", "parts": [{"text": "context"}, {"text": "request"}]}
+    ]
+
+def test_client_reused_per_api_key(monkeypatch):
+    created = []
+    def make_client(api_key):
+        created.append(api_key)
+        client = MagicMock()
+        client.models.generate_content.return_value.text = "ok"
+        return client
+
+    monkeypatch.setattr("google.genai.Client", make_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    gemini.generate_response("one")
+    gemini.generate_response("two")
+    assert created == ["fake-key"]
+
+def test_validate_api_key_lists_models(monkeypatch):
+    mock_client = MagicMock()
+    mock_client.models.list.return_value = iter([MagicMock()])
+    monkeypatch.setattr("google.genai.Client", lambda api_key: mock_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    assert gemini.validate_api_key() is True
+    mock_client.models.generate_content.assert_not_called()
+
+    mock_client.models.list.side_effect = Exception("401")
+    assert gemini.validate_api_key() is False
+
+def test_wrap_error_cache_not_found():
+    err = gemini._wrap_error(Exception("404 NOT_FOUND. CachedContent not found (or permission denied)"))
+    assert isinstance(err, gemini.CacheNotFoundError)
+    quota = gemini._wrap_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert not isinstance(quota, gemini.CacheNotFoundError)
+
+def test_delete_cache_ignores_errors(monkeypatch):
+    mock_client = MagicMock()
+    mock_client.caches.delete.side_effect = Exception("404")
+    monkeypatch.setattr("google.genai.Client", lambda api_key: mock_client)
+    monkeypatch.setattr(config, "get_api_key", lambda: "fake-key")
+
+    gemini.delete_cache("cachedContents/1")
+    mock_client.caches.delete.assert_called_once_with(name="cachedContents/1")
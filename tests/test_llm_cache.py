@@ -0,0 +1,23 @@
+import pytest
+from gai import config, llm_cache
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    mock_dir = tmp_path / ".gai"
+    monkeypatch.setattr(config, "CONFIG_DIR", mock_dir)
+    return mock_dir
+
+def test_put_get_roundtrip(cache_dir):
+    plan = {"reasoning": "r", "plan": "p", "actions": []}
+    key = llm_cache.make_key("model", "context", "request")
+
+    assert llm_cache.get(key) is None
+    llm_cache.put(key, plan)
+    assert llm_cache.get(key) == plan
+    assert (cache_dir / llm_cache.CACHE_FILE_NAME).exists()
+
+    llm_cache.discard(key)
+    assert llm_cache.get(key) is None
+
+def test_make_key_separates_parts():
+    assert llm_cache.make_key("ab", "c") != llm_cache.make_key("a", "bc")
@@ -0,0 +1,19 @@
+import threading
+from gai import prefetch, scanner
+
+def test_prefetch_runs_scan_on_daemon_thread(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_scan():
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(scanner, "scan_project", slow_scan)
+    prefetch.prefetch_project_context()
+    assert started.wait(5)
+    assert prefetch._thread.daemon
+
+    release.set()
+    prefetch.wait_for_prefetch()
+    assert prefetch._thread is None
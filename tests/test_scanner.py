@@ -0,0 +1,112 @@
+import os
+import pytest
+from gai import scanner
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hi')\n")
+    (tmp_path / "README.md").write_text("# Demo\n")
+    return tmp_path
+
+def test_scan_project_lists_and_reads_files(project):
+    ctx = scanner.scan_project()
+    assert "- src/main.py" in ctx
+    assert "- README.md" in ctx
+    assert "### File: src/main.py\n```py\nprint('hi')\n" in ctx
+    # Priority files come first
+    assert ctx.index("### File: src/main.py") < ctx.index("### File: README.md")
+
+def test_scan_project_memoized_until_change(project):
+    first = scanner.scan_project()
+    assert scanner.scan_project() is first
+
+    target = project / "src" / "main.py"
+    target.write_text("print('changed')\n")
+    st = target.stat()
+    os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    second = scanner.scan_project()
+    assert second is not first
+    assert "print('changed')" in second
+
+def test_nested_priority_dir(project):
+    (project / "pkg" / "lib").mkdir(parents=True)
+    (project / "pkg" / "lib" / "util.py").write_text("x = 1\n")
+    ctx = scanner.scan_project()
+    assert ctx.index("### File: pkg/lib/util.py") < ctx.index("### File: README.md")
+
+def test_hidden_dirs_not_walked(project):
+    (project / ".mypy_cache").mkdir()
+    (project / ".mypy_cache" / "x.json").write_text("{}")
+    (project / ".gitignore").write_text("*.pyc\n")
+    ctx = scanner.scan_project()
+    assert ".mypy_cache" not in ctx
+    assert "- .gitignore" in ctx
+
+def test_allowed_dot_dirs_walked(project):
+    (project / ".github" / "workflows").mkdir(parents=True)
+    (project / ".github" / "workflows" / "ci.yml").write_text("on: push\n")
+    ctx = scanner.scan_project()
+    assert "- .github/workflows/ci.yml" in ctx
+    assert "### File: .github/workflows/ci.yml" in ctx
+
+def test_context_budget_reports_omitted(project, monkeypatch):
+    monkeypatch.setattr(scanner, "MAX_CONTEXT_SIZE", 20)
+    (project / "src" / "big.py").write_text("x" * 30)
+    ctx = scanner.scan_project()
+    assert "- src/big.py" in ctx
+    assert "### File: src/big.py" not in ctx
+    assert "(1 files omitted" in ctx
+
+def test_ignored_dir_patterns(project):
+    (project / "demo.egg-info").mkdir()
+    (project / "demo.egg-info" / "PKG-INFO.txt").write_text("meta")
+    assert "egg-info" not in scanner.scan_project()
+
+def test_iter_scan_project_matches_scan(project):
+    pieces = list(scanner.iter_scan_project(force_rescan=True))
+    assert pieces[0].startswith("## Project Context")
+    assert "".join(pieces) == scanner.scan_project(force_rescan=True)
+
+def test_binary_files_skipped(project):
+    (project / "src" / "blob.txt").write_bytes(b"\x00\x01binary")
+    ctx = scanner.scan_project()
+    assert "- src/blob.txt" in ctx
+    assert "### File: src/blob.txt" not in ctx
+
+class _PrefixSpec:
+    """Stand-in for pathspec.PathSpec matching on path prefixes."""
+    def __init__(self, *prefixes):
+        self.prefixes = prefixes
+
+    def match_file(self, path):
+        return path.startswith(self.prefixes)
+
+def test_scan_project_spec_prunes_paths(project):
+    (project / "out").mkdir()
+    (project / "out" / "gen.py").write_text("x = 1\n")
+    ctx = scanner.scan_project(spec=_PrefixSpec("out/", "README"))
+    assert "out/gen.py" not in ctx
+    assert "README.md" not in ctx
+    assert "- src/main.py" in ctx
+
+def test_iter_scan_project_reads_in_a_window(project, monkeypatch):
+    for i in range(6):
+        (project / "src" / f"m{i}.py").write_text(f"x = {i}\n")
+    monkeypatch.setattr(scanner, "READ_WORKERS", 2)
+    reads = []
+    real_read = scanner._read_bytes
+    monkeypatch.setattr(scanner, "_read_bytes", lambda path, size: reads.append(path) or real_read(path, size))
+
+    pieces = scanner.iter_scan_project(force_rescan=True)
+    next(pieces)  # header
+    next(pieces)  # first file's fence
+    assert len(reads) <= 3
+    list(pieces)
+    assert len(reads) == 8
+
+def test_no_ignored_dir_patterns(project, monkeypatch):
+    monkeypatch.setattr(scanner, "_IGNORED_DIR_RE", None)
+    assert "- src/main.py" in scanner.scan_project(force_rescan=True)